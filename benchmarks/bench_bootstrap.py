@@ -0,0 +1,95 @@
+"""Time to get ytcfg and ytInitialData out of a watch page.
+
+Compares the previous bootstrap (read the whole page, then regex + json.loads)
+with scan_watch_page fed the page in the chunks the downloader streams it in,
+and reports how much of the page each has to read:
+
+    python -m benchmarks.bench_bootstrap                 # synthetic ~1MB page
+    python -m benchmarks.bench_bootstrap watch.html ...  # recorded watch pages
+"""
+import argparse
+import timeit
+
+from youtube_comment_downloader.bootstrap import scan_watch_page
+from youtube_comment_downloader.downloader import CommentParser, WATCH_PAGE_CHUNK_SIZE
+
+from .fixtures import FakeVideo
+
+
+def synthetic_page(head_kb, tail_kb):
+    # Inline scripts before ytInitialData (player response, etc.) and after it (the rest of the page)
+    html = FakeVideo().watch_html()
+    head = '<script>var ytInitialPlayerResponse = {"x": "%s"};</script>' % ('p' * head_kb * 1024)
+    tail = '<script>var deferred = "%s";</script>' % ('d' * tail_kb * 1024)
+    html = html.replace('</head><body>', '</head><body>' + head, 1)
+    return html.replace('</body>', tail + '</body>', 1)
+
+
+def chunked(html, size):
+    return [html[i:i + size] for i in range(0, len(html), size)]
+
+
+def read_all(chunks):
+    html = ''.join(chunks)
+    return CommentParser().parse_watch_page(html), len(html)
+
+
+class CountingChunks(object):
+    # Iterates over the chunks, counting the characters handed out
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.read = 0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.read += len(chunk)
+            yield chunk
+
+
+def read_streamed(chunks, ytcfg=True):
+    counting = CountingChunks(chunks)
+    return scan_watch_page(counting, ytcfg), counting.read
+
+
+def best_of(func, repeat, number):
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pages', nargs='*', help='Recorded watch pages (HTML files)')
+    parser.add_argument('--head-kb', type=int, default=300, help='Synthetic script size before ytInitialData')
+    parser.add_argument('--tail-kb', type=int, default=700, help='Synthetic script size after ytInitialData')
+    parser.add_argument('--chunk-size', type=int, default=WATCH_PAGE_CHUNK_SIZE)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, encoding='utf8') as fp:
+                pages.append((path, fp.read()))
+    else:
+        pages = [('synthetic page', synthetic_page(args.head_kb, args.tail_kb))]
+
+    print('%-30s %9s %12s %12s %12s %8s %14s' % ('page', 'size', 'read all', 'streamed', 'cached ytcfg',
+                                                 'speedup', 'read streamed'))
+    for name, html in pages:
+        chunks = chunked(html, args.chunk_size)
+        (expected, _) = read_all(chunks)
+        (result, read) = read_streamed(chunks)
+        if result[1] != (expected[1] or {}) or result[0] != expected[0]:
+            print('%-30s streamed result differs from the full parse' % name[-30:])
+            continue
+        before = best_of(lambda: read_all(chunks), args.repeat, args.number)
+        after = best_of(lambda: read_streamed(chunks), args.repeat, args.number)
+        cached = best_of(lambda: read_streamed(chunks, ytcfg=False), args.repeat, args.number)
+        print('%-30s %7dkB %10.3fms %10.3fms %10.3fms %7.1fx %12.0f%%' % (
+            name[-30:], len(html) // 1024, before * 1e3, after * 1e3, cached * 1e3, before / after,
+            100.0 * read / len(html)))
+
+
+if __name__ == '__main__':
+    main()
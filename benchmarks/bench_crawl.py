@@ -0,0 +1,176 @@
+"""Crawl throughput against the local YouTube stand-in (benchmarks.server).
+
+Starts the server in a subprocess and crawls its video with the library
+(serial and with --workers) and with the CLI. Each run happens in a fresh
+process, so peak RSS is measured per run. Reports comments/s, request latency
+percentiles (of the comment API requests, computed from the recorded latencies)
+and peak RSS. Results can be saved as a baseline, and a later run can be
+compared against it. The comparison exits with status 1 when throughput drops,
+or p50/p99 latency or peak RSS grows, by more than --tolerance:
+
+    python -m benchmarks.bench_crawl --comments 10000
+    python -m benchmarks.bench_crawl --comments 1000000 --replies 50 --modes cli
+    python -m benchmarks.bench_crawl --faults 429=0.01,timeout=0.001 --latency 20
+    python -m benchmarks.bench_crawl --save baseline.json
+    python -m benchmarks.bench_crawl --baseline baseline.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from .server import add_scenario_arguments
+
+MODES = ('serial', 'workers', 'cli')
+VIDEO_ID = 'dQw4w9WgXcQ'
+
+
+def server_arguments(args):
+    argv = ['--comments', str(args.comments), '--per-page', str(args.per_page), '--replies', str(args.replies),
+            '--reply-page-size', str(args.reply_page_size), '--watch-page-kb', str(args.watch_page_kb),
+            '--latency', str(args.latency), '--faults', args.faults, '--retry-after', str(args.retry_after),
+            '--timeout-delay', str(args.timeout_delay), '--seed', str(args.seed)]
+    if args.replay:
+        argv += ['--replay', args.replay]
+    if args.no_consent:
+        argv.append('--no-consent')
+    return argv
+
+
+def start_server(args):
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.server', '--port', '0'] + server_arguments(args),
+                               stdout=subprocess.PIPE, universal_newlines=True)
+    line = process.stdout.readline()
+    if not line.startswith('Serving on '):
+        process.kill()
+        raise RuntimeError('The stand-in server didn\'t start')
+    return process, line.split()[2]
+
+
+def run_measured(command):
+    # Runs a command and returns (exit status, wall seconds, peak RSS in MB) of that process alone
+    start = time.time()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = usage.ru_maxrss / (1024.0 * 1024 if sys.platform == 'darwin' else 1024.0)
+    return process.returncode, time.time() - start, peak
+
+
+def crawl(base_url, workers, stats_path):
+    # Library run, in the child process started by run_mode
+    from youtube_comment_downloader.downloader import YoutubeCommentDownloader, YOUTUBE_CONSENT_URL
+    from youtube_comment_downloader.stats import CrawlStats
+    from urllib.parse import urlparse
+
+    stats = CrawlStats()
+    downloader = YoutubeCommentDownloader(stats=stats, base_url=base_url,
+                                          consent_url=base_url + urlparse(YOUTUBE_CONSENT_URL).path)
+    for _ in downloader.get_comments(VIDEO_ID, sleep=0, workers=workers):
+        pass
+    with open(stats_path, 'w') as fp:
+        fp.write(stats.to_json())
+
+
+def run_mode(mode, base_url, args, workdir):
+    stats_path = os.path.join(workdir, mode + '.stats.json')
+    if mode == 'cli':
+        command = [sys.executable, '-m', 'youtube_comment_downloader', '--base-url', base_url, '-y', VIDEO_ID,
+                   '-o', os.path.join(workdir, 'comments.json'), '--stats', stats_path, '--sleep', '0',
+                   '--checkpoint-interval', '0']
+        if args.workers > 1:
+            command += ['--workers', str(args.workers)]
+    else:
+        command = [sys.executable, '-m', 'benchmarks.bench_crawl', '--crawl', base_url, '--stats-file', stats_path,
+                   '--workers', str(args.workers if mode == 'workers' else 1)]
+    status, wall, peak = run_measured(command)
+    if status != 0:
+        raise RuntimeError('%s run exited with status %d' % (mode, status))
+    with open(stats_path) as fp:
+        stats = json.load(fp)
+
+    comments = stats['counters'].get('comments', 0)
+    api = stats['latency'].get('/youtubei/v1/next', {})
+    return {'comments': comments,
+            'seconds': wall,
+            'comments_per_second': comments / wall if wall > 0 else 0.0,
+            'requests': stats['counters'].get('requests', 0),
+            'p50_ms': (api.get('p50') or 0) * 1e3,
+            'p90_ms': (api.get('p90') or 0) * 1e3,
+            'p99_ms': (api.get('p99') or 0) * 1e3,
+            'peak_rss_mb': peak}
+
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for mode, result in results.items():
+        before = baseline.get(mode)
+        if not before:
+            continue
+        if result['comments_per_second'] < before['comments_per_second'] * (1 - tolerance):
+            found.append('%s: %.0f comments/s, baseline %.0f' % (mode, result['comments_per_second'],
+                                                                  before['comments_per_second']))
+        for percentile in ('p50_ms', 'p99_ms'):
+            if result[percentile] > before[percentile] * (1 + tolerance):
+                found.append('%s: %s latency %.2fms, baseline %.2fms' % (mode, percentile[:3], result[percentile],
+                                                                         before[percentile]))
+        if result['peak_rss_mb'] > before['peak_rss_mb'] * (1 + tolerance):
+            found.append('%s: peak RSS %.1fMB, baseline %.1fMB' % (mode, result['peak_rss_mb'],
+                                                                    before['peak_rss_mb']))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_scenario_arguments(parser)
+    parser.add_argument('--modes', default=','.join(MODES), help='Comma separated runs out of %s' % ', '.join(MODES))
+    parser.add_argument('--workers', type=int, default=4, help='Workers of the workers and cli runs')
+    parser.add_argument('--save', default=None, help='Save the results as a baseline to this file')
+    parser.add_argument('--baseline', default=None, help='Compare with the results saved in this file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression. Defaults to 0.2')
+    parser.add_argument('--crawl', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--stats-file', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.crawl:
+        crawl(args.crawl, args.workers if args.workers > 1 else None, args.stats_file)
+        return
+
+    modes = [mode for mode in args.modes.split(',') if mode]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error('unknown modes: %s' % ', '.join(sorted(unknown)))
+
+    server, base_url = start_server(args)
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            print('%-8s %10s %9s %12s %9s %9s %9s %10s' % ('run', 'comments', 'seconds', 'comments/s', 'p50',
+                                                           'p90', 'p99', 'peak RSS'))
+            for mode in modes:
+                result = results[mode] = run_mode(mode, base_url, args, workdir)
+                print('%-8s %10d %8.2fs %12.0f %7.2fms %7.2fms %7.2fms %8.1fMB' % (
+                    mode, result['comments'], result['seconds'], result['comments_per_second'], result['p50_ms'],
+                    result['p90_ms'], result['p99_ms'], result['peak_rss_mb']))
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.save:
+        with open(args.save, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as fp:
+            found = regressions(results, json.load(fp), args.tolerance)
+        for line in found:
+            print('Regression:', line)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Wall time of the tracklist extraction against a stub LLM client.
+
+The stub answers like the chat completions API: it "extracts" the Artist -
+Title lines of the prompt, takes a round trip plus time per prompt token and
+per generated track (output tokens dominate real latency), and fails a share of
+the requests to the first model. The previous single
+request over the whole snippet is compared with the chunked, parallel pipeline:
+
+    python -m benchmarks.bench_extraction --tracks 60 --fail-rate 0.2
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from djtracks.extraction import MODELS, extract_chunk, extract_tracklist, merge_entries
+from djtracks.prefilter import build_snippet, estimate_tokens
+
+from .bench_prefilter import synthetic_set
+
+LINE_RE = re.compile(r'(?:(\d{1,2}(?::\d{2}){1,2})\s+)?(Artist \d+) - (Title \d+)')
+
+
+class StubClient(object):
+
+    def __init__(self, round_trip=0.5, seconds_per_token=0.0002, seconds_per_track=0.05, fail_rate=0.0, seed=1):
+        self.round_trip = round_trip
+        self.seconds_per_token = seconds_per_token
+        self.seconds_per_track = seconds_per_track
+        self.fail_rate = fail_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, temperature=0, timeout=None):
+        prompt = messages[-1]['content']
+        with self._lock:
+            self.requests += 1
+            fail = model == MODELS[0] and self._random.random() < self.fail_rate
+        tracks = [{'artist': artist, 'track': title, 'version': '', 'label': '', 'time': ts or ''}
+                  for ts, artist, title in LINE_RE.findall(prompt)]
+        latency = (self.round_trip + self.seconds_per_token * estimate_tokens(prompt) +
+                   self.seconds_per_track * len(tracks))
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError('stub timeout')
+        time.sleep(latency)
+        if fail:
+            raise RuntimeError('stub failure')
+        content = 'Here you go:\n' + json.dumps({'tracks': tracks, 'corrections': []})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def single_request(client, comments, max_tokens):
+    # The previous flow: one prompt with everything, models tried one after the other
+    snippet, _ = build_snippet(comments, max_tokens)
+    parsed, _ = extract_chunk(client, snippet, budget=1e9)
+    return merge_entries([parsed['tracks']]) if parsed else []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comments', type=int, default=2000)
+    parser.add_argument('--tracks', type=int, default=60)
+    parser.add_argument('--fail-rate', type=float, default=0.2, help='Share of failed requests to the first model')
+    parser.add_argument('--max-tokens', type=int, default=6000)
+    parser.add_argument('--chunk-tokens', type=int, default=400)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    comments, expected = synthetic_set(args.comments, args.tracks)
+    runs = [('single request', lambda client: single_request(client, comments, args.max_tokens)),
+            ('chunked, %d workers' % args.workers,
+             lambda client: extract_tracklist(client, comments, max_tokens=args.max_tokens,
+                                              chunk_tokens=args.chunk_tokens, workers=args.workers)['tracks'])]
+
+    print('%-24s %10s %10s %10s' % ('pipeline', 'seconds', 'requests', 'tracks'))
+    for name, run in runs:
+        client = StubClient(fail_rate=args.fail_rate)
+        start = time.perf_counter()
+        tracks = run(client)
+        seconds = time.perf_counter() - start
+        print('%-24s %10.2f %10d %6d/%-3d' % (name, seconds, client.requests, len(tracks), len(expected)))
+
+
+if __name__ == '__main__':
+    main()
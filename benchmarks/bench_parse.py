@@ -0,0 +1,55 @@
+"""Per-page parse time of continuation responses.
+
+Compares the previous access pattern (one search_dict scan per key) with the
+single index_dict pass, and times the full parse_response call:
+
+    python -m benchmarks.bench_parse                     # synthetic pages
+    python -m benchmarks.bench_parse response1.json ...  # recorded responses
+"""
+import argparse
+import json
+import timeit
+
+from youtube_comment_downloader.downloader import CommentParser, RESPONSE_KEYS
+
+from .fixtures import FakeVideo
+
+
+def scan_per_key(response):
+    return {key: list(CommentParser.search_dict(response, key)) for key in RESPONSE_KEYS}
+
+
+def best_of(func, response, repeat, number):
+    return min(timeit.repeat(lambda: func(response), repeat=repeat, number=number)) / number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('responses', nargs='*', help='Recorded continuation responses (JSON files)')
+    parser.add_argument('--comments', type=int, default=20, help='Comments per synthetic page')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.responses:
+        pages = []
+        for path in args.responses:
+            with open(path, encoding='utf8') as fp:
+                pages.append((path, json.load(fp)))
+    else:
+        video = FakeVideo(per_page=args.comments)
+        pages = [('synthetic page (%d comments)' % args.comments, video.page(1)),
+                 ('synthetic reply page', video.reply_page('Ugx0000000000', 0))]
+
+    parser_ = CommentParser()
+    print('%-40s %12s %12s %8s %14s' % ('response', 'search_dict', 'index_dict', 'speedup', 'parse_response'))
+    for name, response in pages:
+        before = best_of(scan_per_key, response, args.repeat, args.number)
+        after = best_of(lambda r: CommentParser.index_dict(r, RESPONSE_KEYS), response, args.repeat, args.number)
+        full = best_of(parser_.parse_response, response, args.repeat, args.number)
+        print('%-40s %10.3fms %10.3fms %7.1fx %12.3fms' % (name[-40:], before * 1e3, after * 1e3, before / after,
+                                                           full * 1e3))
+
+
+if __name__ == '__main__':
+    main()
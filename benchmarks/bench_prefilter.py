@@ -0,0 +1,89 @@
+"""Prompt size and tracklist recall of the comment prefilter.
+
+Compares the previous prompt (the first 100 comment texts) with the snippet
+built by djtracks.prefilter, on comment sets downloaded with the CLI or on a
+synthetic set:
+
+    python -m benchmarks.bench_prefilter                         # synthetic set
+    python -m benchmarks.bench_prefilter comments1.json ...      # recorded (NDJSON) sets
+
+Recall is the share of the set's track lines that make it into the prompt. On
+recorded sets track lines are found with the prefilter's own pattern, so it's
+an upper bound there; the synthetic set has planted ground truth.
+"""
+import argparse
+import json
+import random
+import time
+
+from djtracks.prefilter import TRACK_LINE_RE, build_snippet, estimate_tokens
+
+BASELINE_COMMENTS = 100
+
+NOISE = ['fire set 🔥', "who's here in 2024?", 'this is pure energy', 'best mix ever!!', 'tune', '🔥🔥🔥',
+         'I was there, unreal night', "what's the song at {ts}?", "Can't stop listening - so good",
+         'the drop at {ts} 😮', 'need this on spotify', 'legend']
+
+
+def timestamp(seconds):
+    return '%d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60, seconds % 60) if seconds >= 3600 else \
+        '%02d:%02d' % (seconds // 60, seconds % 60)
+
+
+def synthetic_set(count, tracks, seed=1):
+    # Mostly noise, with half of the tracklist in one long comment late in the set and the rest in
+    # single-track comments
+    rng = random.Random(seed)
+    lines = ['%s Artist %d - Title %d' % (timestamp(180 * i + 30), i, i) for i in range(tracks)]
+    comments = [{'text': rng.choice(NOISE).format(ts=timestamp(rng.randrange(7200))), 'reply': False, 'votes': '3'}
+                for _ in range(count)]
+    comments[rng.randrange(count // 2, count)] = {'text': 'Tracklist:\n' + '\n'.join(lines[:tracks // 2]),
+                                                  'reply': False, 'votes': '1.2K'}
+    for line in lines[tracks // 2:]:
+        comments[rng.randrange(count)] = {'text': 'track at ' + line, 'reply': False, 'votes': '40'}
+    return comments, ['Artist %d - Title %d' % (i, i) for i in range(tracks)]
+
+
+def track_lines(comments):
+    return [match.group(0).strip() for comment in comments for match in TRACK_LINE_RE.finditer(comment['text'])]
+
+
+def recall(expected, prompt):
+    return sum(1 for line in expected if line in prompt) / len(expected) if expected else 1.0
+
+
+def load_set(path):
+    with open(path, encoding='utf8') as fp:
+        return [json.loads(line) for line in fp if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('comment_sets', nargs='*', help='Comments downloaded with the CLI (line delimited JSON)')
+    parser.add_argument('--comments', type=int, default=1000, help='Size of the synthetic set')
+    parser.add_argument('--tracks', type=int, default=30, help='Tracks planted in the synthetic set')
+    parser.add_argument('--max-tokens', type=int, default=3000)
+    args = parser.parse_args(argv)
+
+    if args.comment_sets:
+        sets = [(path, comments, track_lines(comments)) for path, comments in
+                ((path, load_set(path)) for path in args.comment_sets)]
+    else:
+        comments, expected = synthetic_set(args.comments, args.tracks)
+        sets = [('synthetic (%d comments)' % args.comments, comments, expected)]
+
+    print('%-32s %9s %9s %9s %9s %9s %11s' % ('set', 'comments', 'tokens', 'recall', 'tokens', 'recall',
+                                             'filter ms'))
+    print('%-32s %9s %19s %19s' % ('', '', 'first %d' % BASELINE_COMMENTS, 'prefilter'))
+    for name, comments, expected in sets:
+        baseline = '\n'.join(comment['text'] for comment in comments[:BASELINE_COMMENTS])
+        start = time.perf_counter()
+        snippet, _ = build_snippet(comments, max_tokens=args.max_tokens)
+        seconds = time.perf_counter() - start
+        print('%-32s %9d %9d %8.0f%% %9d %8.0f%% %11.2f' % (
+            name[-32:], len(comments), estimate_tokens(baseline), 100 * recall(expected, baseline),
+            estimate_tokens(snippet), 100 * recall(expected, snippet), seconds * 1e3))
+
+
+if __name__ == '__main__':
+    main()
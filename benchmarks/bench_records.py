@@ -0,0 +1,75 @@
+"""Memory held by a fully collected crawl.
+
+Keeps the same synthetic comments as the usual dicts, as compact Comment
+records and in a CommentBatch, and reports the traced allocation per comment:
+
+    python -m benchmarks.bench_records --comments 50000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from youtube_comment_downloader.downloader import CommentParser
+from youtube_comment_downloader.records import Comment, CommentBatch
+
+from .fixtures import FakeVideo
+
+AUTHORS = 2000
+
+
+def comment_dicts(count):
+    # Parsed from synthetic pages, so every comment owns its strings like a real crawl, with authors that come
+    # back across comments
+    video = FakeVideo(pages=1, per_page=100)
+    parser = CommentParser()
+    comments = []
+    while len(comments) < count:
+        for comment in parser.parse_response(video.page(1), replies=False)[0]:
+            i = len(comments)
+            comment['cid'] = '%s.%d' % (comment['cid'], i)
+            comment['text'] = 'Track %d - Artist %d ' % (i, i) + comment['text']
+            comment['author'] = '@user%d' % (i % AUTHORS)
+            comment['channel'] = 'UC%022d' % (i % AUTHORS)
+            comment['photo'] = 'https://yt3.ggpht.com/avatar-%d=s88-c-k-c0x00ffffff-no-rj' % (i % AUTHORS)
+            comments.append(comment)
+    return comments[:count]
+
+
+def as_dicts(count):
+    return comment_dicts(count)
+
+
+def as_records(count):
+    now = time.time()
+    return [Comment.from_dict(comment, fetched=now) for comment in comment_dicts(count)]
+
+
+def as_batch(count):
+    return CommentBatch(comment_dicts(count))
+
+
+def traced(build, count):
+    gc.collect()
+    tracemalloc.start()
+    result = build(count)
+    gc.collect()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comments', type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    print('%-20s %12s %12s %14s' % ('representation', 'held MB', 'peak MB', 'bytes/comment'))
+    for name, build in (('dict', as_dicts), ('Comment', as_records), ('CommentBatch', as_batch)):
+        size, peak = traced(build, args.comments)
+        print('%-20s %12.2f %12.2f %14.0f' % (name, size / 1e6, peak / 1e6, size / args.comments))
+
+
+if __name__ == '__main__':
+    main()
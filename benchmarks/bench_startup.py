@@ -0,0 +1,59 @@
+"""Cold-start time of the CLI entry point and the Streamlit app module.
+
+Each target runs in a fresh interpreter with `-X importtime`; the report shows
+the wall time, the total import time and the heaviest top-level imports:
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 10 --top 5
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = [
+    ('package import', ['-c', 'import youtube_comment_downloader']),
+    ('cli --help', ['-m', 'youtube_comment_downloader', '--help']),
+    # Outside of `streamlit run` the app executes in bare mode, which still pays for all of its imports
+    ('streamlit_app', [os.path.join(ROOT, 'streamlit_app.py')]),
+]
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def run(args):
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=ROOT,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    wall = time.perf_counter() - start
+
+    top_level = {}
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match and len(match.group(3)) == 1:
+            top_level[match.group(4)] = int(match.group(2)) / 1e6
+    return wall, top_level, process.returncode
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='Runs per target, the fastest one is reported')
+    parser.add_argument('--top', type=int, default=3, help='Number of heaviest imports to show')
+    args = parser.parse_args(argv)
+
+    print('%-16s %10s %10s  %s' % ('target', 'wall', 'imports', 'heaviest imports'))
+    for name, target in TARGETS:
+        results = [run(target) for _ in range(args.runs)]
+        wall, top_level, returncode = min(results, key=lambda result: result[0])
+        heaviest = sorted(top_level.items(), key=lambda item: -item[1])[:args.top]
+        print('%-16s %8.0fms %8.0fms  %s%s' % (name, wall * 1e3, sum(top_level.values()) * 1e3,
+                                                ', '.join('%s %.0fms' % (mod, sec * 1e3) for mod, sec in heaviest),
+                                                '' if returncode == 0 else '  (exit code %d)' % returncode))
+
+
+if __name__ == '__main__':
+    main()
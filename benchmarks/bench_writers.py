@@ -0,0 +1,90 @@
+"""Output throughput of the comment writers.
+
+Writes the same synthetic comments with the previous per-record print plus
+progress line, and with every writer/format, reporting records/s and the size
+on disk:
+
+    python -m benchmarks.bench_writers --comments 200000
+"""
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from youtube_comment_downloader import write_comments
+from youtube_comment_downloader.downloader import CommentParser
+from youtube_comment_downloader.writers import Progress, open_writer, to_json
+
+from .fixtures import FakeVideo
+
+
+def make_comments(count):
+    video = FakeVideo(pages=1, per_page=100)
+    comments, _, _, _ = CommentParser().parse_response(video.page(1), replies=False)
+    return [dict(comment, cid='%s.%d' % (comment['cid'], i)) for i in range(count // len(comments) + 1)
+            for comment in comments][:count]
+
+
+def write_baseline(comments, path):
+    # The writer this replaced: a print per record and a progress line rewritten after each one
+    with io.open(path, 'w', encoding='utf8') as fp:
+        for count, comment in enumerate(comments, 1):
+            print(to_json(comment), file=fp)
+            sys.stdout.write('Downloaded %d comment(s)\r' % count)
+            sys.stdout.flush()
+
+
+def write_with(format, pretty=False, compression=None):
+    def write(comments, path):
+        with open_writer(path, format, pretty=pretty, compression=compression) as writer:
+            write_comments(comments, writer, progress=Progress())
+    return write
+
+
+def available(module):
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comments', type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    cases = [('baseline (print + progress)', 'json', write_baseline),
+             ('ndjson', 'json', write_with('json')),
+             ('ndjson, pretty', 'json', write_with('json', pretty=True)),
+             ('ndjson, gzip', 'json.gz', write_with('json', compression='gzip'))]
+    if available('zstandard'):
+        cases.append(('ndjson, zstd', 'json.zst', write_with('json', compression='zstd')))
+    if available('pyarrow'):
+        cases += [('parquet', 'parquet', write_with('parquet')),
+                  ('arrow', 'arrow', write_with('arrow'))]
+
+    comments = make_comments(args.comments)
+    tmpdir = tempfile.mkdtemp()
+    results = []
+    try:
+        for i, (name, extension, write) in enumerate(cases):
+            path = os.path.join(tmpdir, '%d.%s' % (i, extension))
+            start = time.perf_counter()
+            write(comments, path)
+            seconds = time.perf_counter() - start
+            results.append((name, len(comments) / seconds, os.path.getsize(path)))
+    finally:
+        shutil.rmtree(tmpdir)
+
+    sys.stdout.write(' ' * 40 + '\r')
+    print('%-30s %14s %12s' % ('writer', 'records/s', 'MB on disk'))
+    for name, rate, size in results:
+        print('%-30s %14.0f %12.2f' % (name, rate, size / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Synthetic YouTube watch pages and continuation responses.
+
+The responses follow the structure the downloader parses (comment threads in
+continuationItems, comment data in frameworkUpdates mutations), so benchmarks
+can run offline without recorded data.
+"""
+import json
+
+API_URL = '/youtubei/v1/next'
+YTCFG = {'INNERTUBE_API_KEY': 'fake-key',
+         'INNERTUBE_CONTEXT': {'client': {'hl': 'en', 'gl': 'US', 'clientName': 'WEB', 'clientVersion': '2.0'}}}
+
+
+def endpoint(token):
+    return {'commandMetadata': {'webCommandMetadata': {'apiUrl': API_URL}},
+            'continuationCommand': {'token': token}}
+
+
+def comment_payloads(cid, text, time='2 weeks ago', hearted=False):
+    key = 'toolbar-' + cid
+    entity = {'commentEntityPayload': {
+        'key': 'entity-' + cid,
+        'properties': {'commentId': cid,
+                       'content': {'content': text},
+                       'publishedTime': time,
+                       'toolbarStateKey': key},
+        'author': {'displayName': '@user' + cid[-3:],
+                   'channelId': 'UC' + cid[-8:],
+                   'avatarThumbnailUrl': 'https://yt3.ggpht.com/' + cid},
+        'toolbar': {'likeCountNotliked': ' 12 ', 'replyCount': '3'}}}
+    state = {'engagementToolbarStateEntityPayload': {
+        'key': key, 'heartState': 'TOOLBAR_HEART_STATE_HEARTED' if hearted else 'TOOLBAR_HEART_STATE_UNHEARTED'}}
+    surface = {'commentSurfaceEntityPayload': {'key': 'surface-' + cid}}
+    return [{'payload': entity}, {'payload': state}, {'payload': surface}]
+
+
+def view_model(cid):
+    return {'commentViewModel': {'commentViewModel': {'commentId': cid, 'commentSurfaceKey': 'surface-' + cid,
+                                                      'commentKey': 'entity-' + cid}}}
+
+
+class FakeVideo(object):
+
+    def __init__(self, pages=3, per_page=20, replies=5, reply_page_size=10):
+        self.pages = pages
+        self.per_page = per_page
+        self.replies = replies
+        self.reply_page_size = reply_page_size
+        self.requests = []
+
+    def response(self, token):
+        self.requests.append(token)
+        kind, _, rest = token.partition(':')
+        if kind == 'page':
+            return self.page(int(rest))
+        if kind == 'replies':
+            thread, _, offset = rest.partition(':')
+            return self.reply_page(thread, int(offset))
+        raise KeyError(token)
+
+    def page(self, n):
+        items = []
+        mutations = []
+        for i in range(self.per_page):
+            cid = 'Ugx%05d%05d' % (n, i)
+            mutations.extend(comment_payloads(cid, 'comment %d on page %d' % (i, n)))
+            thread = view_model(cid)
+            if self.replies:
+                thread['replies'] = {'commentRepliesRenderer': {'contents': [
+                    {'continuationItemRenderer': {'continuationEndpoint': endpoint('replies:%s:0' % cid)}}]}}
+            items.append({'commentThreadRenderer': thread})
+        if n + 1 < self.pages:
+            items.append({'continuationItemRenderer': {'continuationEndpoint': endpoint('page:%d' % (n + 1))}})
+        action = 'reloadContinuationItemsCommand' if n == 0 else 'appendContinuationItemsAction'
+        return {'onResponseReceivedEndpoints': [{action: {'targetId': 'comments-section', 'continuationItems': items}}],
+                'frameworkUpdates': {'entityBatchUpdate': {'mutations': mutations}}}
+
+    def reply_page(self, thread, offset):
+        items = []
+        mutations = []
+        end = min(self.replies, offset + self.reply_page_size)
+        for i in range(offset, end):
+            cid = '%s.r%04d' % (thread, i)
+            mutations.extend(comment_payloads(cid, 'reply %d' % i))
+            items.append(view_model(cid))
+        if end < self.replies:
+            items.append({'continuationItemRenderer': {'button': {'buttonRenderer': {
+                'command': endpoint('replies:%s:%d' % (thread, end))}}}})
+        return {'onResponseReceivedEndpoints': [{'appendContinuationItemsAction': {
+                    'targetId': 'comment-replies-item-' + thread, 'continuationItems': items}}],
+                'frameworkUpdates': {'entityBatchUpdate': {'mutations': mutations}}}
+
+    def watch_html(self):
+        data = {'contents': {'twoColumnWatchNextResults': {'results': {'results': {'contents': [
+            {'itemSectionRenderer': {'contents': [{'continuationItemRenderer': {
+                'continuationEndpoint': endpoint('page:0')}}]}}]}}}},
+                'engagementPanels': [{'engagementPanelSectionListRenderer': {'header': {'sortFilterSubMenuRenderer': {
+                    'subMenuItems': [{'title': 'Top', 'serviceEndpoint': endpoint('page:0')},
+                                     {'title': 'Newest', 'serviceEndpoint': endpoint('page:0')}]}}}}]}
+        return ('<html><head><script>ytcfg.set(%s);</script></head><body>'
+                '<script>var ytInitialData = %s;</script></body></html>' % (json.dumps(YTCFG), json.dumps(data)))
+
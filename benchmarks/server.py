@@ -0,0 +1,268 @@
+"""Local stand-in for the YouTube endpoints the downloader talks to.
+
+Serves the cookie consent redirect and form, watch pages (ytcfg, sort menu)
+and comment/reply continuations. They are either generated by FakeVideo at any
+scale or replayed from a ResponseCache recorded against YouTube (run the CLI
+once with --cache FILE). Latency and faults can be injected: 403/413 end the
+crawl, 429/503 are retried, and a timeout holds the request and then drops the
+connection.
+
+    python -m benchmarks.server --comments 100000 --replies 20 --port 8080
+    python -m benchmarks.server --replay recorded.sqlite --faults 429=0.01,timeout=0.001
+    python -m youtube_comment_downloader --base-url http://127.0.0.1:8080 -y dQw4w9WgXcQ -o out.json
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+from youtube_comment_downloader.cache import ResponseCache, cache_key
+from youtube_comment_downloader.downloader import YOUTUBE_CONSENT_URL, YOUTUBE_URL
+
+from .fixtures import FakeVideo
+
+FAULTS = ('403', '413', '429', '503', 'timeout')
+CONSENT_PATH = urlsplit(YOUTUBE_CONSENT_URL).path
+CONSENT_FORM = ('<html><body><form action="%s" method="POST">'
+                '<input type="hidden" name="gl" value="US">'
+                '<input type="hidden" name="m" value="0">'
+                '<input type="hidden" name="pc" value="yt">'
+                '<input type="hidden" name="hl" value="en">'
+                '<input type="hidden" name="src" value="1">'
+                '<button>Accept all</button></form></body></html>' % CONSENT_PATH)
+
+
+def parse_faults(text):
+    # '429=0.01,timeout=0.001' -> {'429': 0.01, 'timeout': 0.001}
+    faults = {}
+    for part in filter(None, (text or '').split(',')):
+        kind, _, rate = part.partition('=')
+        if kind not in FAULTS:
+            raise ValueError('Unknown fault %r, expected one of %s' % (kind, ', '.join(FAULTS)))
+        faults[kind] = float(rate)
+    return faults
+
+
+class GeneratedVideo(FakeVideo):
+    # FakeVideo sized by its total number of comments, answering any video ID and language
+
+    def __init__(self, comments=10000, per_page=20, replies=5, reply_page_size=10, watch_page_kb=0):
+        pages = max(1, int(math.ceil(comments / float(per_page * (1 + replies)))))
+        super(GeneratedVideo, self).__init__(pages, per_page, replies, reply_page_size)
+        self.total = pages * per_page * (1 + replies)
+        self.padding = '<script>var deferred = "%s";</script>' % ('d' * watch_page_kb * 1024) if watch_page_kb else ''
+        self.html = super(GeneratedVideo, self).watch_html().replace('</body>', self.padding + '</body>')
+
+    def watch_html(self, url=None):
+        return self.html
+
+    def response(self, token, client=None, path=None):
+        try:
+            return self.page_response(token)
+        except (KeyError, ValueError):
+            return None
+
+    def page_response(self, token):
+        kind, _, rest = token.partition(':')
+        if kind == 'page':
+            return self.page(int(rest))
+        if kind == 'replies':
+            thread, _, offset = rest.partition(':')
+            return self.reply_page(thread, int(offset))
+        raise KeyError(token)
+
+
+class ReplayVideo(object):
+    # Watch pages and continuations recorded in a ResponseCache by YoutubeCommentDownloader(cache=...)
+
+    def __init__(self, path):
+        self.cache = ResponseCache(path, ttl=None)
+
+    def watch_html(self, url):
+        # The downloader caches what it found on the watch page rather than the page, which is rebuilt from it
+        page = self.cache.get(cache_key('GET', YOUTUBE_URL + url, 'bootstrap'))
+        if page is None:
+            return None
+        return ('<html><head><script>ytcfg.set(%s);</script></head><body>'
+                '<script>var ytInitialData = %s;</script></body></html>'
+                % (json.dumps(page['ytcfg']), json.dumps(page['data'])))
+
+    def response(self, token, client, path):
+        return self.cache.get(cache_key('POST', YOUTUBE_URL + path, token, client.get('hl'), client.get('gl')))
+
+
+class Scenario(object):
+    # What the server answers with: the video, the added latency (seconds) and the fault rates per request
+
+    def __init__(self, video, latency=0.0, faults=None, consent=True, retry_after=0, timeout_delay=1.0, seed=0):
+        self.video = video
+        self.latency = latency
+        self.faults = faults or {}
+        self.consent = consent
+        self.retry_after = retry_after
+        self.timeout_delay = timeout_delay
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def fault(self):
+        with self._lock:
+            self.requests += 1
+            if not self.faults:
+                return None
+            value = self._random.random()
+        for kind, rate in self.faults.items():
+            if value < rate:
+                return kind
+            value -= rate
+        return None
+
+    def watch_html(self, url):
+        return self.video.watch_html(url)
+
+    def continuation(self, token, client, path):
+        return self.video.response(token, client, path)
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Keep-alive like YouTube, without Nagle's algorithm delaying each body sent after its headers
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        scenario = self.server.scenario
+        url = urlsplit(self.path)
+        if url.path == '/watch':
+            if scenario.consent and 'CONSENT=' not in self.headers.get('Cookie', ''):
+                self.redirect('/consent?continue=' + quote('http://%s%s' % (self.headers['Host'], self.path), safe=''))
+                return
+            html = scenario.watch_html(self.path)
+            if html is None:
+                self.send_error(404)
+                return
+            self.send_body(html, 'text/html; charset=utf-8')
+        elif url.path == '/consent':
+            self.send_body(CONSENT_FORM, 'text/html; charset=utf-8')
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        scenario = self.server.scenario
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        url = urlsplit(self.path)
+        if url.path == CONSENT_PATH:
+            target = parse_qs(url.query).get('continue', ['/'])[0]
+            self.redirect(target, cookie='CONSENT=YES+; Path=/')
+            return
+        if not url.path.startswith('/youtubei/'):
+            self.send_error(404)
+            return
+
+        fault = scenario.fault()
+        if scenario.latency:
+            time.sleep(scenario.latency)
+        if fault == 'timeout':
+            # Hold the request, then hang up without answering
+            time.sleep(scenario.timeout_delay)
+            self.close_connection = True
+            return
+        if fault is not None:
+            headers = {'Retry-After': str(scenario.retry_after)} if fault in ('429', '503') else {}
+            self.send_body('{}', 'application/json', status=int(fault), headers=headers)
+            return
+
+        data = json.loads(body)
+        response = scenario.continuation(data['continuation'], data['context'].get('client', {}), url.path)
+        if response is None:
+            self.send_error(404)
+            return
+        self.send_body(json.dumps(response, separators=(',', ':')), 'application/json')
+
+    def redirect(self, location, cookie=None):
+        self.send_response(302)
+        self.send_header('Location', location)
+        if cookie:
+            self.send_header('Set-Cookie', cookie)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def send_body(self, text, content_type, status=200, headers=None):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(scenario, port=0, host='127.0.0.1'):
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.scenario = scenario
+    return server
+
+
+def serve(scenario, port=0, host='127.0.0.1'):
+    # Starts the server on a daemon thread and returns it; server.server_address has the port it got
+    server = make_server(scenario, port, host)
+    threading.Thread(target=server.serve_forever, name='youtube-stand-in', daemon=True).start()
+    return server
+
+
+def add_scenario_arguments(parser):
+    parser.add_argument('--comments', type=int, default=10000, help='Comments in the generated video, replies included')
+    parser.add_argument('--per-page', type=int, default=20, help='Top-level comments per page')
+    parser.add_argument('--replies', type=int, default=5, help='Replies per thread')
+    parser.add_argument('--reply-page-size', type=int, default=10, help='Replies per reply page')
+    parser.add_argument('--watch-page-kb', type=int, default=0, help='Padding after ytInitialData on the watch page')
+    parser.add_argument('--replay', default=None, help='Replay this recorded ResponseCache instead')
+    parser.add_argument('--latency', type=float, default=0.0, help='Milliseconds added to every API response')
+    parser.add_argument('--faults', default='', help='Fault rates per API request, e.g. 429=0.01,403=0,timeout=0.001')
+    parser.add_argument('--retry-after', type=int, default=0, help='Retry-After seconds sent with 429/503')
+    parser.add_argument('--timeout-delay', type=float, default=1.0, help='Seconds a timed out request is held')
+    parser.add_argument('--no-consent', action='store_true', help='Don\'t redirect to the consent form')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def scenario_from_args(args):
+    if args.replay:
+        video = ReplayVideo(args.replay)
+    else:
+        video = GeneratedVideo(args.comments, args.per_page, args.replies, args.reply_page_size, args.watch_page_kb)
+    return Scenario(video, latency=args.latency / 1000.0, faults=parse_faults(args.faults),
+                    consent=not args.no_consent, retry_after=args.retry_after, timeout_delay=args.timeout_delay,
+                    seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on (0 for any free port)')
+    add_scenario_arguments(parser)
+    args = parser.parse_args(argv)
+
+    scenario = scenario_from_args(args)
+    server = make_server(scenario, args.port, args.host)
+    host, port = server.server_address[:2]
+    total = getattr(scenario.video, 'total', None)
+    # The first line is read by bench_crawl to find the port
+    print('Serving on http://%s:%d%s' % (host, port, ' (%d comments)' % total if total else ''), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
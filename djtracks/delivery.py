@@ -0,0 +1,139 @@
+import hashlib
+import html
+import os
+import shutil
+import time
+import zipfile
+from urllib.parse import quote
+
+# Served by Streamlit's static file handler (server.enableStaticServing), which streams files from disk in
+# chunks, so handing out a track doesn't load it into the Python process. It serves the static directory next
+# to the app's main script, whatever the working directory, only files whose real path is inside it, and only
+# files up to MAX_STATIC_FILE_SIZE.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+MAX_STATIC_FILE_SIZE = 200 * 1024 * 1024
+DELIVERY_DIR = "dl"
+STATIC_URL = "app/static"
+# Zips of a selection are rebuilt on demand, old ones are removed when a new one is built
+ZIP_MAX_AGE = 24 * 3600
+# Bytes a ZIP adds per file on top of its name (local header, central directory entry, ZIP64 extras), and once
+# at its end
+ZIP_ENTRY_OVERHEAD = 256
+ZIP_END_OVERHEAD = 1024
+# Links to single files that haven't been handed out for this long are removed when a new one is published.
+# A hard link keeps the file's disk space in use after the library evicts it, until the link is gone too.
+LINK_MAX_AGE = 24 * 3600
+
+
+def _token(*parts):
+    return hashlib.sha1("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _file_token(path):
+    stat = os.stat(path)
+    return _token(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _url(relative_path):
+    return f"{STATIC_URL}/{quote(relative_path.replace(os.sep, '/'))}"
+
+
+def publish(path, static_dir=STATIC_DIR):
+    # Makes a downloaded file reachable under the static directory (a hard link where possible, otherwise a
+    # copy: the handler won't follow a symlink out of it) and returns its URL. The link name depends on the
+    # file's path, size and mtime, so it's only created once however many times the page reruns.
+    relative_path = os.path.join(DELIVERY_DIR, _file_token(path), os.path.basename(path))
+    target = os.path.join(static_dir, relative_path)
+    if os.path.exists(target):
+        # The link directory's mtime is when the link was last handed out
+        os.utime(os.path.dirname(target))
+    else:
+        prune_links(static_dir)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(path, target)
+        except OSError:
+            part = target + ".part"
+            shutil.copyfile(path, part)
+            os.replace(part, target)
+    return _url(relative_path)
+
+
+def unpublish(path, static_dir=STATIC_DIR):
+    # Removes the links publish() made to the file, so deleting it frees its disk space. Must be called
+    # before the file is deleted, the link name depends on its size and mtime.
+    shutil.rmtree(os.path.join(static_dir, DELIVERY_DIR, _file_token(path)), ignore_errors=True)
+
+
+def zip_parts(paths, max_size=MAX_STATIC_FILE_SIZE):
+    # Splits the files, in order, into groups whose stored ZIP stays within max_size. A file too large for a
+    # part of its own still gets one.
+    parts = []
+    size = ZIP_END_OVERHEAD
+    for path in paths:
+        entry = os.path.getsize(path) + ZIP_ENTRY_OVERHEAD + 2 * len(os.path.basename(path).encode("utf-8"))
+        if not parts or size + entry > max_size:
+            parts.append([])
+            size = ZIP_END_OVERHEAD
+        parts[-1].append(path)
+        size += entry
+    return parts
+
+
+def build_zips(paths, name="tracks.zip", static_dir=STATIC_DIR, max_size=MAX_STATIC_FILE_SIZE):
+    # Writes the files into ZIPs under the static directory, as many as it takes to keep each one servable,
+    # and returns their (URL, file name). MP3s don't compress, so they're stored as they are, copied in
+    # chunks. The same selection maps to the same ZIPs, which are reused.
+    parts = zip_parts(paths, max_size)
+    stem, ext = os.path.splitext(name)
+    names = [name] if len(parts) == 1 else [f"{stem}-{i}-of-{len(parts)}{ext}" for i in range(1, len(parts) + 1)]
+    return [(build_zip(part, part_name, static_dir), part_name) for part, part_name in zip(parts, names)]
+
+
+def build_zip(paths, name="tracks.zip", static_dir=STATIC_DIR):
+    # Writes the files into one ZIP under the static directory and returns its URL. build_zips splits
+    # selections too large for one.
+    relative_path = os.path.join(DELIVERY_DIR, "zip", _token(*sorted(_file_token(path) for path in paths)), name)
+    target = os.path.join(static_dir, relative_path)
+    if not os.path.exists(target):
+        prune_zips(static_dir)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        part = target + ".part"
+        with zipfile.ZipFile(part, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for path in paths:
+                archive.write(path, arcname=os.path.basename(path))
+        os.replace(part, target)
+    return _url(relative_path)
+
+
+def prune_zips(static_dir=STATIC_DIR, max_age=ZIP_MAX_AGE):
+    zip_dir = os.path.join(static_dir, DELIVERY_DIR, "zip")
+    if not os.path.isdir(zip_dir):
+        return
+    cutoff = time.time() - max_age
+    for token in os.listdir(zip_dir):
+        directory = os.path.join(zip_dir, token)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        if not os.listdir(directory):
+            os.rmdir(directory)
+
+
+def prune_links(static_dir=STATIC_DIR, max_age=LINK_MAX_AGE):
+    delivery_dir = os.path.join(static_dir, DELIVERY_DIR)
+    if not os.path.isdir(delivery_dir):
+        return
+    cutoff = time.time() - max_age
+    for token in os.listdir(delivery_dir):
+        directory = os.path.join(delivery_dir, token)
+        if token != "zip" and os.path.getmtime(directory) < cutoff:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def download_link(url, name):
+    # HTML for st.markdown(..., unsafe_allow_html=True). The download attribute makes the browser save the
+    # file under its own name whatever content type it's served with.
+    return (f'<a href="{html.escape(url)}" download="{html.escape(name)}">'
+            f"⬇️ Download {html.escape(name)}</a>")
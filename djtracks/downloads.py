@@ -0,0 +1,206 @@
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .library import OUTTMPL
+
+FETCH_WORKERS = 4
+MP3_BITRATE = "192k"
+# Callbacks hear about download progress in steps of this share, not on every chunk
+PROGRESS_STEP = 0.05
+
+
+class DownloadJob(object):
+    # Progress of one track through the queue. status goes queued -> downloading -> downloaded -> transcoding
+    # -> done, or ends as cached (found in the library), skipped (the MP3 is already there) or failed; progress
+    # is the downloaded share, from 0 to 1. Callbacks added with add_callback(callback) are called with the job
+    # on each status change and every PROGRESS_STEP of download progress.
+
+    def __init__(self, url, title=None, video_id=None, artist=None, track=None):
+        self.url = url
+        self.title = title or url
+        self.video_id = video_id
+        self.artist = artist
+        self.track = track
+        self.status = "queued"
+        self.progress = 0.0
+        self.path = None
+        self.error = None
+        self._finished = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
+
+    def add_callback(self, callback):
+        # Called from the thread making each change, and right away if the job is already finished
+        with self._lock:
+            self._callbacks.append(callback)
+            done = self.done
+        if done:
+            callback(self)
+
+    def update(self, status, progress=None):
+        if progress is not None:
+            self.progress = progress
+        self.status = status
+        self._changed()
+
+    def advance(self, progress):
+        steps = int(progress / PROGRESS_STEP) - int(self.progress / PROGRESS_STEP)
+        self.progress = progress
+        if steps:
+            self._changed()
+
+    def finish(self, path, status="done"):
+        self.path = path
+        self.progress = 1.0
+        self.status = status
+        self._finished.set()
+        self._changed()
+
+    def fail(self, error):
+        self.error = error
+        self.status = "failed"
+        self._finished.set()
+        self._changed()
+
+    def _changed(self):
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                # Like concurrent.futures callbacks, a failing one doesn't affect the download
+                pass
+
+
+class DownloadQueue(object):
+    # Downloads audio on a pool of fetch threads and hands each file to a separate pool, sized to the CPU count,
+    # that transcodes it to MP3 with ffmpeg. Network I/O of the next tracks overlaps with the encoding of the
+    # previous ones. A URL that's already queued or in progress gives back its existing job. With a library,
+    # tracks it already has (by video ID or artist/track) are served from it and new MP3s are added to it.
+
+    def __init__(self, outdir="downloads", ffmpeg="ffmpeg", fetch_workers=FETCH_WORKERS, transcode_workers=None,
+                 bitrate=MP3_BITRATE, library=None):
+        self.outdir = outdir
+        self.library = library
+        self.ffmpeg = ffmpeg
+        self.bitrate = bitrate
+        self._fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="fetch")
+        self._transcode_pool = ThreadPoolExecutor(max_workers=transcode_workers or os.cpu_count() or 1,
+                                                  thread_name_prefix="transcode")
+        self._local = threading.local()
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def ydl_options(self):
+        # No postprocessors: the MP3 conversion runs on the transcode pool instead of the fetch thread
+        return {
+            "format": "bestaudio/best",
+            "outtmpl": os.path.join(self.outdir, OUTTMPL),
+            "progress_hooks": [self._progress_hook],
+            "ffmpeg_location": self.ffmpeg,
+            "quiet": True,
+            "noprogress": True,
+        }
+
+    def submit(self, url, title=None, video_id=None, artist=None, track=None):
+        with self._lock:
+            job = self._active.get(url)
+            if job is None or job.done:
+                job = self._active[url] = DownloadJob(url, title, video_id, artist, track)
+                job.add_callback(self._forget)
+                self._fetch_pool.submit(self._fetch, job)
+            return job
+
+    def _forget(self, job):
+        # Only jobs in progress are kept, to hand them out again
+        if job.done:
+            with self._lock:
+                if self._active.get(job.url) is job:
+                    del self._active[job.url]
+
+    def _ydl(self):
+        # YoutubeDL instances aren't thread-safe, so each fetch thread keeps its own
+        if not hasattr(self._local, "ydl"):
+            import yt_dlp
+
+            os.makedirs(self.outdir, exist_ok=True)
+            self._local.ydl = yt_dlp.YoutubeDL(self.ydl_options())
+        return self._local.ydl
+
+    def _progress_hook(self, status):
+        # Called by yt-dlp on the fetch thread running the job
+        job = self._local.job
+        total = status.get("total_bytes") or status.get("total_bytes_estimate")
+        if status.get("status") == "downloading" and total:
+            job.advance(min(status.get("downloaded_bytes", 0) / total, 1.0))
+
+    def _fetch(self, job):
+        self._local.job = job
+        try:
+            if self._from_library(job):
+                return
+            ydl = self._ydl()
+            info = ydl.extract_info(job.url, download=False)
+            job.title = info.get("title") or job.title
+            job.video_id = info.get("id") or job.video_id
+            if self._from_library(job):
+                return
+            source = ydl.prepare_filename(info)
+            mp3 = os.path.splitext(source)[0] + ".mp3"
+            if os.path.exists(mp3):
+                job.finish(self._add_to_library(job, mp3), status="skipped")
+                return
+            job.update("downloading")
+            info = ydl.process_ie_result(info, download=True)
+            source = (info.get("requested_downloads") or [{}])[0].get("filepath") or source
+            job.update("downloaded", progress=1.0)
+            if source == mp3:
+                job.finish(self._add_to_library(job, mp3))
+                return
+        except Exception as e:
+            job.fail(e)
+            return
+        self._transcode_pool.submit(self._transcode, job, source, mp3)
+
+    def _transcode(self, job, source, mp3):
+        job.update("transcoding")
+        part = mp3 + ".part"
+        command = [self.ffmpeg, "-y", "-loglevel", "error", "-i", source, "-vn",
+                   "-codec:a", "libmp3lame", "-b:a", self.bitrate, "-f", "mp3", part]
+        try:
+            subprocess.run(command, check=True, capture_output=True)
+            os.replace(part, mp3)
+            os.remove(source)
+            mp3 = self._add_to_library(job, mp3)
+        except Exception as e:
+            # Neither the partial MP3 nor the source would ever be used: the track is downloaded again next time
+            for path in (part, source):
+                if os.path.exists(path):
+                    os.remove(path)
+            if isinstance(e, subprocess.CalledProcessError):
+                message = e.stderr.decode("utf-8", "replace").strip()
+                e = RuntimeError(message or f"ffmpeg exited with {e.returncode}")
+            job.fail(e)
+            return
+        job.finish(mp3)
+
+    def _from_library(self, job):
+        path = self.library.lookup(job.video_id, job.artist, job.track) if self.library else None
+        if path:
+            job.finish(path, status="cached")
+        return bool(path)
+
+    def _add_to_library(self, job, mp3):
+        if self.library is None or not job.video_id:
+            return mp3
+        return self.library.add(job.video_id, mp3, job.title, job.artist, job.track)
@@ -0,0 +1,161 @@
+import json
+import re
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from youtube_comment_downloader.cache import cache_key
+
+from .prefilter import chunk_texts, select_comments
+
+MODELS = ["gpt-4", "gpt-3.5-turbo"]
+FIELDS = ("artist", "track", "version", "label", "time")
+
+SYSTEM_PROMPT = (
+    "You are a world-class DJ-set tracklist curator.\n"
+    "Given raw YouTube comment texts, extract timestamped tracks and corrections.\n"
+    "Return ONLY JSON with 'tracks' and 'corrections' lists "
+    "(fields: artist, track, version, label, time)."
+)
+FEW_SHOT = (
+    "### Example Input:\n"
+    "Comments:\n"
+    "03:45 John Noseda - Climax\n"
+    "05:10 Roy - Shooting Star [1987]\n"
+    "07:20 Cormac - Sparks\n"
+    "10:00 edit: John Noseda - Climax (VIP Mix)\n\n"
+    "### Example JSON Output:\n"
+    "{ 'tracks': [ {'artist':'John Noseda','track':'Climax','version':'','label':'','time':'03:45'}, ... ], "
+    "'corrections': [ {'artist':'John Noseda','track':'Climax','version':'VIP Mix','label':'','time':'10:00'} ] }"
+)
+
+JSON_RE = re.compile(r"\{[\s\S]*\}")
+TIME_RE = re.compile(r"^(?:(\d{1,2}):)?(\d{1,2}):(\d{2})$")
+NOT_WORD_RE = re.compile(r"[^\w\s]+")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def extract_json(raw):
+    match = JSON_RE.search(raw)
+    return match.group(0) if match else raw.strip()
+
+
+def normalize(text):
+    # Case, accents, punctuation and spacing don't make a different track
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii")
+    return WHITESPACE_RE.sub(" ", NOT_WORD_RE.sub(" ", text.casefold())).strip()
+
+
+def parse_timestamp(value):
+    # "1:02:03" -> 3723 seconds, None if there's no usable timestamp
+    match = TIME_RE.match(str(value or "").strip())
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def clean_entry(entry):
+    if not isinstance(entry, dict):
+        return None
+    entry = {field: str(entry.get(field) or "").strip() for field in FIELDS}
+    if not entry["artist"] or not entry["track"]:
+        return None
+    return entry
+
+
+def merge_entries(batches):
+    # Dedupes entries from several chunks by normalized artist/title. Duplicates fill in fields the first
+    # occurrence left empty, and the earliest timestamp wins. The result is ordered by timestamp, with entries
+    # without one after those that have one, in the order the chunks (and the entries within them) came in.
+    merged = {}
+    for chunk_index, entries in enumerate(batches):
+        for position, entry in enumerate(entries):
+            entry = clean_entry(entry)
+            if entry is None:
+                continue
+            key = (normalize(entry["artist"]), normalize(entry["track"]))
+            seconds = parse_timestamp(entry["time"])
+            if key not in merged:
+                merged[key] = (entry, seconds, (chunk_index, position))
+                continue
+            first, first_seconds, order = merged[key]
+            for field in FIELDS:
+                if not first[field]:
+                    first[field] = entry[field]
+            if seconds is not None and (first_seconds is None or seconds < first_seconds):
+                first["time"] = entry["time"]
+                merged[key] = (first, seconds, order)
+    ordered = sorted(merged.values(), key=lambda item: (item[1] is None, item[1] or 0, item[2]))
+    return [entry for entry, _, _ in ordered]
+
+
+def result_key(chunk, model):
+    # Content address of a model's answer: the same comments with the same prompt give the same tracklist
+    return cache_key("extraction", WHITESPACE_RE.sub(" ", chunk).strip(), model, SYSTEM_PROMPT, FEW_SHOT)
+
+
+def extract_chunk(client, chunk, models=MODELS, budget=60.0, cache=None):
+    # Tries the models in order on one chunk until one returns a valid tracklist, giving each attempt whatever
+    # is left of the chunk's time budget. Returns (parsed, model), or (None, None) if every model failed or the
+    # budget ran out. With a cache (a ResponseCache), the first model's earlier answer is reused. Answers of the
+    # other models aren't cached: they're stand-ins given while the first one failed, which it may not next time.
+    if cache is not None:
+        parsed = cache.get(result_key(chunk, models[0]))
+        if parsed is not None:
+            return parsed, models[0]
+
+    deadline = time.monotonic() + budget
+    for model in models:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            resp = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system",    "content": SYSTEM_PROMPT},
+                    {"role": "assistant", "content": FEW_SHOT},
+                    {"role": "user",      "content": f"Comments:\n{chunk}"},
+                ],
+                temperature=0,
+                timeout=remaining,
+            )
+            parsed = json.loads(extract_json(resp.choices[0].message.content))
+        except Exception:
+            continue
+        if (
+            isinstance(parsed, dict)
+            and isinstance(parsed.get("tracks"), list)
+            and isinstance(parsed.get("corrections"), list)
+        ):
+            parsed = {"tracks": parsed["tracks"], "corrections": parsed["corrections"]}
+            if cache is not None and model == models[0]:
+                cache.set(result_key(chunk, model), parsed)
+            return parsed, model
+    return None, None
+
+
+def extract_tracklist(client, comments, models=MODELS, max_tokens=6000, chunk_tokens=400, workers=4,
+                      chunk_budget=60.0, cache=None, on_chunk=None):
+    # Map-reduce extraction: the prefiltered comments are split into token-bounded chunks that are sent to
+    # the model concurrently, then the tracks and corrections of all chunks are merged. `client` is anything
+    # with the OpenAI client's chat.completions.create. on_chunk(done, total) is called as chunks finish.
+    chunks = chunk_texts(select_comments(comments, max_tokens), chunk_tokens)
+    results = [(None, None)] * len(chunks)
+    if chunks:
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            futures = {pool.submit(extract_chunk, client, chunk, models, chunk_budget, cache): index
+                       for index, chunk in enumerate(chunks)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                results[futures[future]] = future.result()
+                if on_chunk:
+                    on_chunk(done, len(chunks))
+    parsed = [result for result, _ in results if result is not None]
+    return {
+        "tracks": merge_entries([result["tracks"] for result in parsed]),
+        "corrections": merge_entries([result["corrections"] for result in parsed]),
+        "chunks": len(chunks),
+        "failed": len(chunks) - len(parsed),
+        "models": sorted({model for _, model in results if model}),
+    }
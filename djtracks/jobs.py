@@ -0,0 +1,215 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from youtube_comment_downloader.cache import cache_key
+
+JOB_WORKERS = 4
+# Finished jobs are kept (and their results reused by identical submissions) this long
+RESULT_TTL = 24 * 3600
+# Running jobs are touched this often by the runner working on them. A job that hasn't been touched for
+# STALE_AFTER seconds belonged to a runner that died, and is queued again.
+HEARTBEAT = 10
+STALE_AFTER = 6 * HEARTBEAT
+# How often idle workers look for jobs submitted by other processes
+POLL_INTERVAL = 0.5
+FINISHED = ("done", "failed")
+# Returned by a handler whose job is finished later, from another thread, through report.finish() or
+# report.fail(). The worker goes on to the next job in the meantime.
+DEFERRED = object()
+
+
+class Job(object):
+    # Snapshot of a job. status goes queued -> running -> done or failed; progress runs from 0 to 1, with an
+    # optional message and detail (anything JSON-serializable) set by the handler along the way.
+
+    def __init__(self, row):
+        (self.id, self.kind, params, self.status, self.progress, self.message, detail, result, self.error,
+         self.created, self.updated) = row
+        self.params = json.loads(params)
+        self.detail = json.loads(detail) if detail is not None else None
+        self.result = json.loads(result) if result is not None else None
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    def __repr__(self):
+        return f"Job({self.id!r}, {self.kind!r}, status={self.status!r}, progress={self.progress:.2f})"
+
+
+class Reporter(object):
+    # The report callable handed to a handler, bound to its job
+
+    def __init__(self, runner, job_id):
+        self.runner = runner
+        self.job_id = job_id
+
+    def __call__(self, progress, message=None, detail=None):
+        self.runner._report(self.job_id, progress, message, detail)
+
+    def finish(self, result):
+        self.runner._update(self.job_id, status="done", progress=1.0, result=json.dumps(result))
+
+    def fail(self, error):
+        self.runner._update(self.job_id, status="failed", error=str(error) or type(error).__name__)
+
+
+class JobRunner(object):
+    # SQLite-backed job queue worked by a pool of threads. A job is a kind and JSON-serializable params, run
+    # by handlers[kind](params, report), which returns the (JSON-serializable) result and can call
+    # report(progress, message=None, detail=None) while it works. A handler waiting on work done elsewhere can
+    # return DEFERRED instead, freeing its worker, and finish the job later with report.finish(result) or
+    # report.fail(error). Submitting a job identical to one that's queued or running gives back that job, and so
+    # does one that finished within result_ttl, whose result is reused. The queue file can be shared by several
+    # processes, each with its own runner: jobs are claimed atomically, and the ones a dead process left running
+    # are picked up again once their heartbeat is stale.
+
+    def __init__(self, path, handlers, workers=JOB_WORKERS, result_ttl=RESULT_TTL):
+        self.handlers = handlers
+        self.result_ttl = result_ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._wake = threading.Condition()
+        self._closed = threading.Event()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, "
+                         "key TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL, progress REAL NOT NULL, "
+                         "message TEXT, detail TEXT, result TEXT, error TEXT, owner TEXT, "
+                         "created REAL NOT NULL, updated REAL NOT NULL)")
+        # At most one queued or running job per key, across processes
+        self._db.execute("CREATE UNIQUE INDEX IF NOT EXISTS jobs_active ON jobs (key) "
+                         "WHERE status IN ('queued', 'running')")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+        self._threads = [threading.Thread(target=self._work, name=f"job-{i}", daemon=True) for i in range(workers)]
+        self._threads.append(threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, kind, params, reuse_result=True):
+        # Returns the ID of the job doing this work: an identical queued or running one, an identical one
+        # that's finished recently (with reuse_result), or a new one
+        if kind not in self.handlers:
+            raise ValueError(f"No handler for {kind!r} jobs")
+        key = cache_key("job", kind, params)
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT id FROM jobs WHERE key = ? AND status IN ('queued', 'running')",
+                                       (key,)).fetchone()
+                if row is None and reuse_result:
+                    row = self._db.execute("SELECT id FROM jobs WHERE key = ? AND status = 'done' AND updated > ? "
+                                           "ORDER BY updated DESC LIMIT 1", (key, now - self.result_ttl)).fetchone()
+                if row is None:
+                    job_id = uuid.uuid4().hex
+                    self._db.execute("INSERT INTO jobs (id, kind, key, params, status, progress, created, updated) "
+                                     "VALUES (?, ?, ?, ?, 'queued', 0, ?, ?)",
+                                     (job_id, kind, key, json.dumps(params), now, now))
+                else:
+                    job_id = row[0]
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT id, kind, params, status, progress, message, detail, result, error, "
+                                   "created, updated FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(row) if row else None
+
+    def wait(self, job_id, timeout=None, interval=POLL_INTERVAL):
+        # Blocks until the job is finished (or the timeout passes) and returns its latest snapshot
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            job = self.get(job_id)
+            if job is None or job.done or (deadline is not None and time.time() >= deadline):
+                return job
+            time.sleep(interval)
+
+    def prune(self):
+        # Deletes jobs that finished more than result_ttl ago
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated < ?",
+                             (time.time() - self.result_ttl,))
+
+    def close(self):
+        self._closed.set()
+        with self._wake:
+            self._wake.notify_all()
+        for thread in self._threads:
+            thread.join()
+        with self._lock:
+            self._db.close()
+
+    def _claim(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT id, kind, params FROM jobs WHERE status = 'queued' "
+                                       "ORDER BY created LIMIT 1").fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE jobs SET status = 'running', owner = ?, updated = ? WHERE id = ?",
+                                     (self.owner, time.time(), row[0]))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return row
+
+    def _work(self):
+        while not self._closed.is_set():
+            row = self._claim()
+            if row is None:
+                with self._wake:
+                    self._wake.wait(POLL_INTERVAL)
+                continue
+            job_id, kind, params = row
+            report = Reporter(self, job_id)
+            try:
+                result = self.handlers[kind](json.loads(params), report)
+            except Exception as e:
+                report.fail(e)
+            else:
+                if result is not DEFERRED:
+                    report.finish(result)
+
+    def _report(self, job_id, progress, message=None, detail=None):
+        fields = {"progress": min(max(progress, 0.0), 1.0)}
+        if message is not None:
+            fields["message"] = message
+        if detail is not None:
+            fields["detail"] = json.dumps(detail)
+        self._update(job_id, **fields)
+
+    def _update(self, job_id, **fields):
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def _heartbeat(self):
+        while True:
+            now = time.time()
+            with self._lock:
+                self._db.execute("UPDATE jobs SET updated = ? WHERE status = 'running' AND owner = ?",
+                                 (now, self.owner))
+                requeued = self._db.execute("UPDATE jobs SET status = 'queued', owner = NULL "
+                                            "WHERE status = 'running' AND updated < ?",
+                                            (now - STALE_AFTER,)).rowcount
+            if requeued:
+                with self._wake:
+                    self._wake.notify_all()
+            self.prune()
+            if self._closed.wait(HEARTBEAT):
+                return
@@ -0,0 +1,198 @@
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from .delivery import STATIC_DIR, unpublish
+from .extraction import normalize
+
+LIBRARY_ROOT = "downloads"
+# Downloads are named "<title> [<video id>].mp3", which is how rebuild() maps files back to videos
+OUTTMPL = "%(title)s [%(id)s].%(ext)s"
+VIDEO_ID_RE = re.compile(r"\[([A-Za-z0-9_-]{11})\]\.mp3$")
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def track_key(artist, track):
+    return f"{normalize(artist)} - {normalize(track)}"
+
+
+class Library(object):
+    # SQLite index of the downloaded MP3s: video ID -> file, size and checksum, plus the normalized
+    # "artist - track" keys the file was requested under. Files with the same checksum are stored once. With
+    # max_size (bytes), the least recently used files are deleted once the library grows past it, along with
+    # the links delivery.publish() made to them under static_dir. The index can be shared between threads and
+    # processes.
+
+    def __init__(self, path=os.path.join(LIBRARY_ROOT, "library.sqlite"), root=LIBRARY_ROOT, max_size=None,
+                 static_dir=STATIC_DIR):
+        self.root = root
+        self.max_size = max_size
+        self.static_dir = static_dir
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS tracks (video_id TEXT PRIMARY KEY, path TEXT NOT NULL, "
+                         "size INTEGER NOT NULL, checksum TEXT NOT NULL, title TEXT, added REAL NOT NULL, "
+                         "accessed REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS tracks_checksum ON tracks (checksum)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS tracks_accessed ON tracks (accessed)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS track_keys (key TEXT PRIMARY KEY, video_id TEXT NOT NULL)")
+
+    def lookup(self, video_id=None, artist=None, track=None):
+        # Path of the file for a video, or else of the file an artist/track was requested as before, or None.
+        # Entries whose file is gone are dropped.
+        with self._lock:
+            candidates = [video_id] if video_id else []
+            if artist and track:
+                row = self._db.execute("SELECT video_id FROM track_keys WHERE key = ?",
+                                       (track_key(artist, track),)).fetchone()
+                if row:
+                    candidates.append(row[0])
+            for candidate in candidates:
+                row = self._db.execute("SELECT path FROM tracks WHERE video_id = ?", (candidate,)).fetchone()
+                if row is None:
+                    continue
+                if not os.path.exists(row[0]):
+                    self._forget(candidate)
+                    continue
+                self._db.execute("UPDATE tracks SET accessed = ? WHERE video_id = ?", (time.time(), candidate))
+                return row[0]
+            return None
+
+    def add(self, video_id, path, title=None, artist=None, track=None):
+        # Indexes a downloaded file and returns the path to use for it: an identical file that's already in the
+        # library takes its place.
+        size = os.path.getsize(path)
+        checksum = file_checksum(path)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT path FROM tracks WHERE checksum = ? AND path != ?",
+                                   (checksum, path)).fetchone()
+            if row is not None and os.path.exists(row[0]):
+                os.remove(path)
+                path = row[0]
+            self._db.execute("INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (video_id, path, size, checksum, title, now, now))
+            if artist and track:
+                self._db.execute("INSERT OR REPLACE INTO track_keys VALUES (?, ?)",
+                                 (track_key(artist, track), video_id))
+            self._evict(keep=path)
+        return path
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def evict(self):
+        with self._lock:
+            self._evict()
+
+    def total_size(self):
+        # Files shared by several videos count once
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM "
+                                    "(SELECT MAX(size) AS size FROM tracks GROUP BY path)").fetchone()[0]
+
+    def rebuild(self):
+        # Re-indexes the library from the files on disk: entries for missing files are dropped and named
+        # downloads that aren't indexed yet are added. Returns (indexed, dropped).
+        with self._lock:
+            rows = self._db.execute("SELECT video_id, path FROM tracks").fetchall()
+        dropped = 0
+        for video_id, path in rows:
+            if not os.path.exists(path):
+                with self._lock:
+                    self._forget(video_id)
+                dropped += 1
+        indexed = 0
+        known = {path for _, path in rows}
+        for name in sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []:
+            match = VIDEO_ID_RE.search(name)
+            path = os.path.join(self.root, name)
+            if match and path not in known:
+                title = name[:match.start()].strip()
+                self.add(match.group(1), path, title=title)
+                indexed += 1
+        return indexed, dropped
+
+    def unindexed_files(self):
+        # MP3s under root without a video ID in their name, like the "<title>.mp3" files downloaded before the
+        # library existed. rebuild() can't index them, so they don't count towards max_size and are never evicted.
+        if not os.path.isdir(self.root):
+            return []
+        return [os.path.join(self.root, name) for name in sorted(os.listdir(self.root))
+                if name.endswith(".mp3") and not VIDEO_ID_RE.search(name)]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _forget(self, video_id):
+        self._db.execute("DELETE FROM tracks WHERE video_id = ?", (video_id,))
+        self._db.execute("DELETE FROM track_keys WHERE video_id = ?", (video_id,))
+
+    def _evict(self, keep=None):
+        if self.max_size is None:
+            return
+        files = self._db.execute("SELECT path, MAX(size), MAX(accessed) FROM tracks GROUP BY path "
+                                 "ORDER BY MAX(accessed)").fetchall()
+        excess = sum(size for _, size, _ in files) - self.max_size
+        for path, size, _ in files:
+            if excess <= 0:
+                break
+            if path == keep:
+                continue
+            if os.path.exists(path):
+                # Hard links to the file would keep its disk space in use
+                unpublish(path, self.static_dir)
+                os.remove(path)
+            for (video_id,) in self._db.execute("SELECT video_id FROM tracks WHERE path = ?", (path,)).fetchall():
+                self._forget(video_id)
+            excess -= size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Maintain the index of downloaded tracks",
+        epilog="Only files named '<title> [<video id>].mp3' are indexed. MP3s downloaded under their title alone, "
+               "before the library existed, can't be mapped back to their video: they aren't counted towards "
+               "--max-size nor evicted. rebuild lists them; rename them with their video ID or delete them.")
+    parser.add_argument("command", choices=("rebuild", "stats", "evict"))
+    parser.add_argument("--root", default=LIBRARY_ROOT, help="Directory with the downloaded MP3s")
+    parser.add_argument("--index", default=None, help="Index file. Defaults to library.sqlite in --root")
+    parser.add_argument("--max-size", type=float, default=None, help="Size limit in MB, used by evict")
+    parser.add_argument("--static-dir", default=STATIC_DIR,
+                        help="Directory the app publishes tracks under, whose links to evicted files are removed")
+    args = parser.parse_args(argv)
+
+    max_size = args.max_size * 1024 * 1024 if args.max_size is not None else None
+    library = Library(args.index or os.path.join(args.root, "library.sqlite"), root=args.root, max_size=max_size,
+                      static_dir=args.static_dir)
+    if args.command == "rebuild":
+        indexed, dropped = library.rebuild()
+        print(f"Indexed {indexed} new file(s), dropped {dropped} missing file(s)")
+        unindexed = library.unindexed_files()
+        if unindexed:
+            print(f"{len(unindexed)} file(s) without a video ID in their name aren't indexed:")
+            for path in unindexed:
+                print(f"  {path}")
+    elif args.command == "evict":
+        library.evict()
+    print(f"{library.count()} track(s), {library.total_size() / 1024 / 1024:.1f} MB")
+    library.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import re
+
+# Rough token count for English/latin text, close enough to budget a prompt without a tokenizer
+CHARS_PER_TOKEN = 4
+
+TIMESTAMP_RE = re.compile(r"(?<![\d:])(?:\d{1,2}:)?\d{1,2}:\d{2}(?![\d:])")
+# "Artist - Title", optionally numbered or timestamped, on a line of its own
+TRACK_LINE_RE = re.compile(
+    r"^\s*(?:\d{1,3}[.)]\s*)?(?:[\[(]?(?:\d{1,2}:)?\d{1,2}:\d{2}[\])]?\s*[-–—|:]?\s*)?"
+    r"[^\s\-–—][^\n]{0,60}?\s[-–—]\s\S[^\n]{1,100}$",
+    re.MULTILINE,
+)
+ID_RE = re.compile(r"\bID\s*[-–—]\s*ID\b|\bunreleased\b|\btrack\s*id\b|\bid\?", re.IGNORECASE)
+CORRECTION_RE = re.compile(
+    r"\b(?:edit|correction|actually|it'?s|that'?s|is called|wrong|remix|vip|mix|bootleg|rework|dub)\b",
+    re.IGNORECASE,
+)
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def score_text(text, reply=False):
+    # How likely a comment carries tracklist content. Track lines weigh most, timestamps only count up to the
+    # number of track lines (a timestamp on its own is usually "what's the song at 12:34?" or "the drop at
+    # 45:00"), and corrections count in replies or next to a track line.
+    track_lines = len(TRACK_LINE_RE.findall(text))
+    score = 3.0 * track_lines + min(len(TIMESTAMP_RE.findall(text)), track_lines)
+    if ID_RE.search(text):
+        score += 2.0
+    if (reply or track_lines) and CORRECTION_RE.search(text):
+        score += 1.0
+    return score
+
+
+def parse_votes(votes):
+    # "1.2K" -> 1200
+    votes = (votes or "0").strip().upper().replace(",", "")
+    scale = {"K": 1e3, "M": 1e6}.get(votes[-1:], 1)
+    try:
+        return float(votes.rstrip("KM")) * scale
+    except ValueError:
+        return 0.0
+
+
+def rank_comments(comments):
+    # Returns (score, votes, index, text) for the distinct comments that score above zero, best first
+    ranked = []
+    seen = set()
+    for index, comment in enumerate(comments):
+        if isinstance(comment, str):
+            text, reply, votes = comment, False, 0.0
+        else:
+            text = comment.get("text", "")
+            reply, votes = comment.get("reply", False), parse_votes(comment.get("votes"))
+        key = WHITESPACE_RE.sub(" ", text).strip().lower()
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        score = score_text(text, reply)
+        if score > 0:
+            ranked.append((score, votes, index, text.strip()))
+    ranked.sort(key=lambda item: (-item[0], -item[1], item[2]))
+    return ranked
+
+
+def select_comments(comments, max_tokens=3000):
+    # Fills the token budget with the best ranked comments and returns their texts in the original order, so
+    # corrections stay after what they correct
+    selected = []
+    tokens = 0
+    for score, votes, index, text in rank_comments(comments):
+        cost = estimate_tokens(text) + 1
+        if tokens + cost > max_tokens:
+            continue
+        selected.append((index, text))
+        tokens += cost
+    selected.sort()
+    return [text for _, text in selected]
+
+
+def build_snippet(comments, max_tokens=3000):
+    # The selected comments joined as a prompt snippet, with the number of comments kept
+    texts = select_comments(comments, max_tokens)
+    return "\n".join(texts), len(texts)
+
+
+def chunk_texts(texts, chunk_tokens=1000):
+    # Groups texts into snippets of at most chunk_tokens (estimated). Texts longer than that, like a full
+    # tracklist, are split between lines.
+    chunks = []
+    current = []
+    tokens = 0
+    for text in texts:
+        parts = [text]
+        if estimate_tokens(text) > chunk_tokens:
+            parts = [line for line in text.splitlines() if line.strip()]
+        for part in parts:
+            cost = estimate_tokens(part) + 1
+            if current and tokens + cost > chunk_tokens:
+                chunks.append("\n".join(current))
+                current, tokens = [], 0
+            current.append(part)
+            tokens += cost
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from youtube_comment_downloader.cache import cache_key
+
+SEARCH_WORKERS = 8
+YDL_OPTS = {
+    "quiet": True,
+    "skip_download": True,
+    "extract_flat": True,
+}
+
+_local = threading.local()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def search_query(entry):
+    return f"{entry['artist']} - {entry['track']}"
+
+
+def _ydl():
+    # YoutubeDL instances aren't thread-safe, so each pool thread keeps its own (and its HTTP connections)
+    if not hasattr(_local, "ydl"):
+        import yt_dlp
+
+        _local.ydl = yt_dlp.YoutubeDL(YDL_OPTS)
+    return _local.ydl
+
+
+def _search(query):
+    info = _ydl().extract_info(f"ytsearch1:{query}", download=False)
+    vid = (info.get("entries") or [None])[0]
+    if vid is None:
+        return None
+    vid_id = vid.get("id") or vid.get("url")
+    return {
+        "id": vid_id,
+        "title": vid.get("title"),
+        "webpage_url": f"https://www.youtube.com/watch?v={vid_id}",
+        "thumbnail": f"https://img.youtube.com/vi/{vid_id}/hqdefault.jpg",
+    }
+
+
+def resolve_query(query, cache=None):
+    # First YouTube result for a query, or None. Results (misses included) are kept in `cache`, a
+    # ResponseCache whose TTL decides how long a query's result is reused. Failed searches aren't cached.
+    key = cache_key("ytsearch1", query)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached["video"]
+    try:
+        video = _search(query)
+    except Exception:
+        return None
+    if cache is not None:
+        cache.set(key, {"video": video})
+    return video
+
+
+def _get_pool():
+    # One bounded pool per process, shared by all sessions, so the per-thread YoutubeDLs stay warm
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="ytsearch")
+        return _pool
+
+
+def resolve_candidates(entries, cache=None):
+    # Yields (index, video) for each entry as soon as its search is done, in completion order
+    futures = {
+        _get_pool().submit(resolve_query, search_query(entry), cache): index
+        for index, entry in enumerate(entries)
+    }
+    for future in as_completed(futures):
+        yield futures[future], future.result()
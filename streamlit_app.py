@@ -1,26 +1,37 @@
 import os
-import requests
 import tarfile
 import stat
-import json
-import re
+import threading
+from functools import partial
 
 import streamlit as st
-import yt_dlp
-from openai import OpenAI
 from youtube_comment_downloader.downloader import (
     YoutubeCommentDownloader,
     SORT_BY_POPULAR,
 )
+from youtube_comment_downloader.cache import ResponseCache
+
+from djtracks.delivery import build_zips, download_link, publish
+from djtracks.downloads import DownloadQueue
+from djtracks.extraction import MODELS, extract_tracklist
+from djtracks.jobs import DEFERRED, JobRunner
+from djtracks.library import Library
+from djtracks.prefilter import select_comments
+from djtracks.search import resolve_candidates, resolve_query, search_query
 
 # ── BUNDLE IN FFmpeg AT RUNTIME ─────────────────────────────────────────────────
 FF_DIR = "ffmpeg-static"
 FF_BIN = os.path.join(FF_DIR, "ffmpeg")
 FP_BIN = os.path.join(FF_DIR, "ffprobe")
 
+# Only the download paths need FFmpeg, so it's fetched on first use (once per process)
+# rather than at the top of every script run.
+@st.cache_resource(show_spinner="Fetching FFmpeg…")
 def ensure_ffmpeg():
     if os.path.isfile(FF_BIN) and os.path.isfile(FP_BIN):
         return
+    import requests
+
     os.makedirs(FF_DIR, exist_ok=True)
     url = "https://johnvansickle.com/ffmpeg/releases/ffmpeg-release-amd64-static.tar.xz"
     local_tar = os.path.join(FF_DIR, "ffmpeg.tar.xz")
@@ -39,45 +50,188 @@ def ensure_ffmpeg():
     os.chmod(FF_BIN, stat.S_IXUSR | stat.S_IRUSR)
     os.chmod(FP_BIN, stat.S_IXUSR | stat.S_IRUSR)
 
-ensure_ffmpeg()
+# Shared by every session and worker process on this machine: downloaded comment pages for an hour, so
+# extracting the same set again doesn't re-download it, and the first model's answers per chunk of comments
+# for a month.
+CACHE_DIR = "cache"
+
+@st.cache_resource
+def comment_cache():
+    return ResponseCache(os.path.join(CACHE_DIR, "comments.sqlite"), ttl=3600, max_size=256 * 1024 * 1024)
+
+@st.cache_resource
+def llm_cache():
+    return ResponseCache(os.path.join(CACHE_DIR, "llm.sqlite"), ttl=30 * 24 * 3600, max_size=64 * 1024 * 1024)
+
+# Downloads of all sessions go through one queue: audio is fetched by a few threads and converted to MP3 on a
+# pool sized to the CPU count, so the next downloads overlap with the encoding.
+@st.cache_resource
+def download_queue():
+    ensure_ffmpeg()
+    library = Library(os.path.join("downloads", "library.sqlite"), root="downloads", max_size=LIBRARY_MAX_SIZE)
+    return DownloadQueue(outdir="downloads", ffmpeg=FF_BIN, library=library)
+
+# ── BACKGROUND JOBS ─────────────────────────────────────────────────────────────
+# Extractions and downloads run on a pool of job workers, not in the script run: a rerun or another click
+# doesn't restart them, identical jobs of different users are run once, and results are kept in the job
+# queue (shared by every process on this machine). Pages poll their job's progress.
+JOB_WORKERS = 4
+JOB_POLL_INTERVAL = 1.0
+
+def extract_job(params, report, api_key, comments_cache, results_cache):
+    # Job handler: downloads the comments of params["url"] and extracts the tracklist from them
+    report(0.0, "Downloading comments…")
+    try:
+        downloader = YoutubeCommentDownloader(cache=comments_cache)
+        comments = []
+        for comment in downloader.get_comments_from_url(
+            params["url"], sort_by=SORT_FLAG, limit=COMMENT_LIMIT, workers=COMMENT_WORKERS
+        ):
+            comments.append(comment)
+            if len(comments) % 100 == 0:
+                report(0.2 * len(comments) / COMMENT_LIMIT, f"Downloading comments… {len(comments)}")
+    except Exception as e:
+        raise RuntimeError(f"Failed to download comments: {e}")
+    if not comments:
+        raise RuntimeError("No comments found.")
+    # Only comments that look like tracklists (timestamps, "Artist - Title" lines, IDs, corrections)
+    # go into the prompts, best first until the token budget is used up.
+    kept = len(select_comments(comments, max_tokens=SNIPPET_TOKENS))
+    if not kept:
+        raise RuntimeError("No tracklist-like comments found.")
+
+    # One GPT request per chunk of comments, in parallel
+    report(0.2, f"{len(comments)} comments downloaded, {kept} look like tracklists. Extracting track IDs…")
+    from openai import OpenAI
+
+    # Failed requests fall through to the next model instead of being retried
+    client = OpenAI(api_key=api_key, max_retries=0)
+    result = extract_tracklist(
+        client, comments, models=MODELS, max_tokens=SNIPPET_TOKENS, chunk_tokens=CHUNK_TOKENS,
+        workers=LLM_WORKERS, chunk_budget=CHUNK_BUDGET, cache=results_cache,
+        on_chunk=lambda done, total: report(0.2 + 0.8 * done / total, f"Extracting track IDs… {done}/{total}"),
+    )
+    if result["failed"] == result["chunks"]:
+        raise RuntimeError("GPT failed to extract tracklist.")
+    result.update(comments=len(comments), kept=kept)
+    return result
+
+def download_row(download):
+    return {
+        "name": os.path.basename(download.path) if download.path else download.title,
+        "status": download.status,
+        "progress": download.progress,
+        "path": download.path,
+        "error": str(download.error) if download.error else None,
+    }
+
+def download_job(params, report):
+    # Job handler: queues params["videos"] (dicts of DownloadQueue.submit arguments). The job row is updated by
+    # the tracks' callbacks as their status changes, and finished by the last one, so no job worker is held
+    # while they download.
+    downloads = [download_queue().submit(**video) for video in params["videos"]]
+    lock = threading.Lock()
+    finished = []
+
+    def update(_=None):
+        with lock:
+            if finished:
+                return
+            rows = [download_row(download) for download in downloads]
+            if all(download.done for download in downloads):
+                finished.append(True)
+                report.finish(rows)
+            else:
+                report(sum(row["progress"] for row in rows) / len(rows), detail=rows)
+
+    for download in downloads:
+        download.add_callback(update)
+    update()
+    return DEFERRED
+
+@st.cache_resource
+def job_runner():
+    handlers = {
+        "extract": partial(extract_job, api_key=api_key, comments_cache=comment_cache(), results_cache=llm_cache()),
+        "download": download_job,
+    }
+    return JobRunner(os.path.join(CACHE_DIR, "jobs.sqlite"), handlers, workers=JOB_WORKERS)
+
+def submit_downloads(videos):
+    # FFmpeg is fetched here, with its spinner, rather than on a job worker
+    download_queue()
+    # Not reused once finished: the download queue already serves tracks it has from the library
+    return job_runner().submit("download", {"videos": videos}, reuse_result=False)
+
+@st.fragment(run_every=JOB_POLL_INTERVAL)
+def poll_job(job_id):
+    # Redrawn on its own while the job runs, then the whole page reruns to show the result
+    job = job_runner().get(job_id)
+    if job is None or job.done:
+        st.rerun()
+    if job.kind == "download" and job.detail:
+        show_download_rows(job.detail)
+    else:
+        st.progress(job.progress, text=job.message or "Waiting for a free worker…")
+
+def finished_job(key):
+    # The job whose ID is in st.session_state[key], once it's finished. Until then its progress is shown.
+    job_id = st.session_state.get(key)
+    job = job_runner().get(job_id) if job_id else None
+    if job is not None and not job.done:
+        poll_job(job.id)
+        return None
+    return job
+
+def show_download_rows(rows):
+    for row in rows:
+        name = row["name"]
+        if row["status"] == "done":
+            st.success(f"✅ Downloaded {name}")
+        elif row["status"] in ("cached", "skipped"):
+            st.info(f"Already downloaded {name}")
+        elif row["status"] == "failed":
+            st.error(f"Error downloading {name}: {row['error']}")
+        elif row["status"] in ("downloaded", "transcoding"):
+            st.progress(1.0, text=f"{name}: converting to MP3…")
+        else:
+            st.progress(row["progress"], text=f"{name}: {row['status']} {row['progress']:.0%}")
+
+def show_finished_downloads(job):
+    # Shows how a finished download job went, with links to its files, and returns their paths
+    if job.status == "failed":
+        st.error(f"Error downloading: {job.error}")
+        return []
+    show_download_rows(job.result)
+    paths = [row["path"] for row in job.result if row["path"] and os.path.exists(row["path"])]
+    for path in paths:
+        show_download_link(path)
+    return paths
+
+def show_download_link(path):
+    # Files are served from disk by Streamlit's static file handler (see .streamlit/config.toml) instead of
+    # being read into st.download_button on every rerun
+    st.markdown(download_link(publish(path), os.path.basename(path)), unsafe_allow_html=True)
 
 st.set_page_config(page_title="DJ Set Tracklist & MP3 Downloader", layout="centered")
 st.title("🎧 DJ Set Tracklist Extractor & MP3 Downloader")
 
 # ── CONFIGURATION ──────────────────────────────────────────────────────────────
 api_key      = st.secrets.get("OPENAI_API_KEY", "")
-COMMENT_LIMIT = 100
+COMMENT_LIMIT = 1000
+COMMENT_WORKERS = 4
+SNIPPET_TOKENS = 6000
+CHUNK_TOKENS  = 400
+CHUNK_BUDGET  = 60
+LLM_WORKERS   = 4
 SORT_FLAG     = SORT_BY_POPULAR
-MODELS        = ["gpt-4", "gpt-3.5-turbo"]
+LIBRARY_MAX_SIZE = 5 * 1024 ** 3
 
 # ── UTIL: Fetch YouTube search results ──────────────────────────────────────────
-@st.cache_data(show_spinner=False)
-def fetch_video_candidates(entries):
-    ydl_opts = {
-        "quiet": True,
-        "skip_download": True,
-        "extract_flat": True,
-    }
-    results = []
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        for e in entries:
-            query = f"{e['artist']} - {e['track']}"
-            try:
-                info = ydl.extract_info(f"ytsearch1:{query}", download=False)
-                vid = info.get("entries", [None])[0]
-                if vid is None:
-                    results.append(None)
-                else:
-                    vid_id = vid.get("id") or vid.get("url")
-                    results.append({
-                        "id": vid_id,
-                        "title": vid.get("title"),
-                        "webpage_url": f"https://www.youtube.com/watch?v={vid_id}",
-                        "thumbnail": f"https://img.youtube.com/vi/{vid_id}/hqdefault.jpg",
-                    })
-            except Exception:
-                results.append(None)
-    return results
+# Each search is cached on its own for a day, so editing one track doesn't redo the others.
+@st.cache_resource
+def search_cache():
+    return ResponseCache(os.path.join(CACHE_DIR, "search.sqlite"), ttl=24 * 3600, max_size=16 * 1024 * 1024)
 
 # ── SECTION: YouTube Set Extraction ─────────────────────────────────────────────
 video_url = st.text_input(
@@ -93,80 +247,22 @@ if st.button("Extract Tracks", key="extract_setlist"):
         st.error("Please enter a YouTube URL.")
         st.stop()
 
-    # Step 1: download comments
-    st.info("Step 1: downloading comments…")
-    try:
-        downloader    = YoutubeCommentDownloader()
-        raw_comments  = downloader.get_comments_from_url(video_url, sort_by=SORT_FLAG)
-        comments      = [c.get("text", "") for c in raw_comments][:COMMENT_LIMIT]
-        if not comments:
-            raise RuntimeError("No comments found.")
-        st.success(f"✅ {len(comments)} comments downloaded.")
-    except Exception as e:
-        st.error(f"Failed to download comments: {e}")
-        st.stop()
-
-    # Step 2: extract via GPT
-    st.info("Step 2: extracting track IDs…")
-    client = OpenAI(api_key=api_key)
-    system_prompt = (
-        "You are a world-class DJ-set tracklist curator.\n"
-        "Given raw YouTube comment texts, extract timestamped tracks and corrections.\n"
-        "Return ONLY JSON with 'tracks' and 'corrections' lists "
-        "(fields: artist, track, version, label)."
-    )
-    few_shot = (
-        "### Example Input:\n"
-        "Comments:\n"
-        "03:45 John Noseda - Climax\n"
-        "05:10 Roy - Shooting Star [1987]\n"
-        "07:20 Cormac - Sparks\n"
-        "10:00 edit: John Noseda - Climax (VIP Mix)\n\n"
-        "### Example JSON Output:\n"
-        "{ 'tracks': [ {'artist':'John Noseda','track':'Climax','version':'','label':''}, ... ], "
-        "'corrections': [ {'artist':'John Noseda','track':'Climax','version':'VIP Mix','label':''} ] }"
-    )
-    snippet = "\n".join(comments)
-
-    def extract_json(raw: str) -> str:
-        match = re.search(r"\{[\s\S]*\}", raw)
-        return match.group(0) if match else raw.strip()
-
-    tracks = []
-    corrections = []
-    used_model = None
-    for model in MODELS:
-        try:
-            resp = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system",    "content": system_prompt},
-                    {"role": "assistant", "content": few_shot},
-                    {"role": "user",      "content": f"Comments:\n{snippet}"},
-                ],
-                temperature=0,
-            )
-            out    = resp.choices[0].message.content
-            js     = extract_json(out)
-            parsed = json.loads(js)
-            if (
-                isinstance(parsed, dict)
-                and "tracks" in parsed
-                and "corrections" in parsed
-            ):
-                tracks      = parsed["tracks"]
-                corrections = parsed["corrections"]
-                used_model  = model
-                break
-        except Exception:
-            continue
-
-    if used_model is None:
-        st.error("❌ GPT failed to extract tracklist.")
-        st.stop()
+    st.session_state["extract_job"] = job_runner().submit("extract", {"url": video_url.strip()})
+    st.session_state.pop("dj_tracks", None)
 
-    st.success(f"✅ {len(tracks)} tracks + {len(corrections)} corrections.")
-    st.session_state["dj_tracks"] = tracks + corrections
+extract = finished_job("extract_job")
+if extract is not None:
+    if extract.status == "failed":
+        st.error(f"❌ {extract.error}")
+    else:
+        result = extract.result
+        st.success(f"✅ {result['comments']} comments downloaded, {result['kept']} look like tracklists.")
+        if result["failed"]:
+            st.warning(f"{result['failed']} of {result['chunks']} comment chunks couldn't be extracted.")
+        tracks      = result["tracks"]
+        corrections = result["corrections"]
+        st.success(f"✅ {len(tracks)} tracks + {len(corrections)} corrections.")
+        st.session_state["dj_tracks"] = tracks + corrections
 
 # ── SECTION: Download YouTube Video as MP3 ───────────────────────────────────────
 st.write("---")
@@ -180,38 +276,11 @@ if st.button("Download Video as MP3", key="download_direct"):
     if not video_direct_url.strip():
         st.error("Please enter a YouTube Video URL.")
     else:
-        st.info("Downloading MP3…")
-        os.makedirs("downloads", exist_ok=True)
-        ydl_opts = {
-            "format": "bestaudio/best",
-            "outtmpl": os.path.join("downloads", "%(title)s.%(ext)s"),
-            "postprocessors": [
-                {
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": "mp3",
-                    "preferredquality": "192",
-                }
-            ],
-            "ffmpeg_location": FF_BIN,
-            "ffprobe_location": FP_BIN,
-            "quiet": True,
-        }
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(video_direct_url, download=True)
-                mp3  = ydl.prepare_filename(info).rsplit(".", 1)[0] + ".mp3"
-            st.success(f"✅ Downloaded {os.path.basename(mp3)}")
-            with open(mp3, "rb") as f:
-                data = f.read()
-            st.download_button(
-                label=f"Download {os.path.basename(mp3)}",
-                data=data,
-                file_name=os.path.basename(mp3),
-                mime="audio/mp3",
-                key="direct_dl_button",
-            )
-        except Exception as e:
-            st.error(f"Failed to download: {e}")
+        st.session_state["direct_job"] = submit_downloads([{"url": video_direct_url.strip()}])
+
+direct = finished_job("direct_job")
+if direct is not None:
+    show_finished_downloads(direct)
 
 # ── SECTION: Manual Track Search ───────────────────────────────────────────────
 st.write("---")
@@ -223,10 +292,10 @@ if st.button("Search Tracks", key="search_manual"):
         st.error("Please enter both artist and track title.")
     else:
         entry = {"artist": artist_manual.strip(), "track": track_manual.strip()}
-        result = fetch_video_candidates([entry])[0]
+        result = resolve_query(search_query(entry), cache=search_cache())
         if result:
             st.session_state["manual_video"] = result
-            st.session_state.pop("manual_mp3", None)
+            st.session_state.pop("manual_job", None)
         else:
             st.session_state.pop("manual_video", None)
             st.error(f"No YouTube match for {artist_manual} – {track_manual}")
@@ -238,43 +307,14 @@ if "manual_video" in st.session_state:
     c2.markdown(f"**[{video['title']}]({video['webpage_url']})**")
     c2.caption(f"Search: `{artist_manual} - {track_manual}`")
     if c3.button("Download MP3", key="download_manual"):
-        st.info("Downloading MP3…")
-        os.makedirs("downloads", exist_ok=True)
-        ydl_opts = {
-            "format": "bestaudio/best",
-            "outtmpl": os.path.join("downloads", "%(title)s.%(ext)s"),
-            "postprocessors": [
-                {
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": "mp3",
-                    "preferredquality": "192",
-                }
-            ],
-            "ffmpeg_location": FF_BIN,
-            "ffprobe_location": FP_BIN,
-            "quiet": True,
-        }
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(video["webpage_url"], download=True)
-                mp3  = ydl.prepare_filename(info).rsplit(".", 1)[0] + ".mp3"
-            st.success(f"✅ Downloaded {os.path.basename(mp3)}")
-            st.session_state["manual_mp3"] = mp3
-        except Exception as e:
-            st.error(f"Error downloading {artist_manual} – {track_manual}: {e}")
-
-if "manual_mp3" in st.session_state:
-    path = st.session_state["manual_mp3"]
-    if os.path.exists(path):
-        with open(path, "rb") as f:
-            data = f.read()
-        st.download_button(
-            label=f"Download {os.path.basename(path)}",
-            data=data,
-            file_name=os.path.basename(path),
-            mime="audio/mp3",
-            key="manual_dl_button",
-        )
+        st.session_state["manual_job"] = submit_downloads([{
+            "url": video["webpage_url"], "title": video["title"], "video_id": video["id"],
+            "artist": artist_manual.strip(), "track": track_manual.strip(),
+        }])
+
+manual = finished_job("manual_job")
+if manual is not None:
+    show_finished_downloads(manual)
 
 # ── SECTION: Extracted Tracklist Preview & Download ────────────────────────────
 if "dj_tracks" in st.session_state:
@@ -284,62 +324,39 @@ if "dj_tracks" in st.session_state:
         st.write(f"{idx}. {e['artist']} – {e['track']}")
     st.write("---")
     st.write("### Preview YouTube results (select which to download)")
-    candidates = fetch_video_candidates(entries)
-    to_download = []
-    for i, vid in enumerate(candidates):
+    # One placeholder per track, filled in as the searches (run in parallel) come back
+    rows = [st.empty() for _ in entries]
+    selected = {}
+    for i, vid in resolve_candidates(entries, cache=search_cache()):
         entry = entries[i]
         if vid is None:
-            st.error(f"No match for {entry['artist']} – {entry['track']}")
+            rows[i].error(f"No match for {entry['artist']} – {entry['track']}")
             continue
-        col1, col2, col3 = st.columns([1, 4, 1])
-        col1.image(vid["thumbnail"], width=100)
-        col2.markdown(f"**[{vid['title']}]({vid['webpage_url']})**")
-        col2.caption(f"Search: `{entry['artist']} - {entry['track']}`")
-        if col3.checkbox("", key=f"select_{i}"):
-            to_download.append(vid)
+        with rows[i].container():
+            col1, col2, col3 = st.columns([1, 4, 1])
+            col1.image(vid["thumbnail"], width=100)
+            col2.markdown(f"**[{vid['title']}]({vid['webpage_url']})**")
+            col2.caption(f"Search: `{entry['artist']} - {entry['track']}`")
+            if col3.checkbox("", key=f"select_{i}"):
+                selected[i] = {
+                    "url": vid["webpage_url"], "title": vid["title"], "video_id": vid["id"],
+                    "artist": entry["artist"], "track": entry["track"],
+                }
+    to_download = [selected[i] for i in sorted(selected)]
 
     st.write("---")
     if to_download and st.button("Download Selected MP3s", key="download_selected"):
-        st.info("Downloading MP3s…")
-        os.makedirs("downloads", exist_ok=True)
-        downloaded = []
-        for vid in to_download:
-            ydl_opts = {
-                "format": "bestaudio/best",
-                "outtmpl": os.path.join("downloads", "%(title)s.%(ext)s"),
-                "postprocessors": [
-                    {
-                        "key": "FFmpegExtractAudio",
-                        "preferredcodec": "mp3",
-                        "preferredquality": "192",
-                    }
-                ],
-                "ffmpeg_location": FF_BIN,
-                "ffprobe_location": FP_BIN,
-                "quiet": True,
-            }
-            try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(vid["webpage_url"], download=True)
-                    mp3  = ydl.prepare_filename(info).rsplit(".", 1)[0] + ".mp3"
-                st.success(f"✅ {os.path.basename(mp3)}")
-                downloaded.append(mp3)
-            except Exception as ex:
-                st.error(f"Error downloading {vid['title']}: {ex}")
-        st.session_state["downloaded_tracks"] = downloaded
-
-    if "downloaded_tracks" in st.session_state:
+        st.session_state["selected_job"] = submit_downloads(to_download)
+        st.session_state.pop("tracks_zip", None)
+
+    selected_job = finished_job("selected_job")
+    if selected_job is not None:
         st.write("---")
-        for idx, path in enumerate(st.session_state["downloaded_tracks"]):
-            if os.path.exists(path):
-                with open(path, "rb") as f:
-                    data = f.read()
-                st.download_button(
-                    label=f"Download {os.path.basename(path)}",
-                    data=data,
-                    file_name=os.path.basename(path),
-                    mime="audio/mp3",
-                    key=f"persist_dl_{idx}",
-                )
-    elif not to_download:
+        paths = show_finished_downloads(selected_job)
+        if len(paths) > 1 and st.button("Download all as ZIP", key="download_zip"):
+            # Split into several ZIPs when the selection is too large for the static file handler
+            st.session_state["tracks_zip"] = build_zips(paths)
+        for url, name in st.session_state.get("tracks_zip", []):
+            st.markdown(download_link(url, name), unsafe_allow_html=True)
+    elif not to_download and "selected_job" not in st.session_state:
         st.info("Select at least one track to enable download.")
@@ -0,0 +1,20 @@
+import pytest
+
+from benchmarks.server import Scenario, serve
+
+
+@pytest.fixture
+def stand_in():
+    # Starts benchmarks.server on a free port for a video: start(video, **scenario) -> (scenario, base URL)
+    servers = []
+
+    def start(video, **kwargs):
+        scenario = Scenario(video, **kwargs)
+        server = serve(scenario, port=0)
+        servers.append(server)
+        return scenario, 'http://127.0.0.1:%d' % server.server_address[1]
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,56 @@
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+TRACK_RE = re.compile(r'(?:(\d{1,2}(?::\d{2}){1,2})\s+)?(Artist \d+) - (Title \d+)')
+NOISE = ['fire set 🔥', 'best mix ever!!', 'tune', 'I was there, unreal night', "what's the song at {ts}?",
+         'the drop at {ts} 😮', 'need this on spotify', 'legend']
+
+
+def timestamp(seconds):
+    return '%d:%02d:%02d' % (seconds // 3600, seconds // 60 % 60, seconds % 60) if seconds >= 3600 else \
+        '%02d:%02d' % (seconds // 60, seconds % 60)
+
+
+def tracklist_comments(count, tracks, seed=1):
+    # Mostly noise, with half of the tracks in one long comment and the rest in single-track comments. Returns
+    # the comments and the "Artist - Title" lines, in the order they're played.
+    rng = random.Random(seed)
+    lines = ['%s Artist %d - Title %d' % (timestamp(180 * i + 30), i, i) for i in range(tracks)]
+    comments = [{'text': rng.choice(NOISE).format(ts=timestamp(rng.randrange(7200))), 'reply': False, 'votes': '3'}
+                for _ in range(count)]
+    comments[rng.randrange(count // 2, count)] = {'text': 'Tracklist:\n' + '\n'.join(lines[:tracks // 2]),
+                                                  'reply': False, 'votes': '1.2K'}
+    for line in lines[tracks // 2:]:
+        comments[rng.randrange(count)] = {'text': 'track at ' + line, 'reply': False, 'votes': '40'}
+    return comments, ['Artist %d - Title %d' % (i, i) for i in range(tracks)]
+
+
+class StubClient(object):
+    # Answers like the chat completions API by "extracting" the Artist N - Title N lines of the prompt. Models
+    # in failing raise instead. Each track takes seconds_per_track, so chunks finish out of order.
+
+    def __init__(self, failing=(), seconds_per_track=0.001):
+        self.failing = set(failing)
+        self.seconds_per_track = seconds_per_track
+        self.models = []
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    @property
+    def requests(self):
+        return len(self.models)
+
+    def create(self, model, messages, temperature=0, timeout=None):
+        with self._lock:
+            self.models.append(model)
+        if model in self.failing:
+            raise RuntimeError('stub failure')
+        tracks = [{'artist': artist, 'track': title, 'version': '', 'label': '', 'time': ts or ''}
+                  for ts, artist, title in TRACK_RE.findall(messages[-1]['content'])]
+        time.sleep(self.seconds_per_track * len(tracks))
+        content = 'Here you go:\n' + json.dumps({'tracks': tracks, 'corrections': []})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
@@ -0,0 +1,189 @@
+import json
+import os
+from urllib.parse import urlparse
+
+import pytest
+import requests
+
+from benchmarks.server import GeneratedVideo
+from youtube_comment_downloader import main
+from youtube_comment_downloader.cache import ResponseCache
+from youtube_comment_downloader.downloader import (RESPONSE_KEYS, YOUTUBE_CONSENT_URL, CommentParser,
+                                                   YoutubeCommentDownloader)
+from youtube_comment_downloader.incremental import HighWaterMark, SinceState
+from youtube_comment_downloader.retry import CircuitBreaker
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+
+
+class FlakyVideo(GeneratedVideo):
+    # GeneratedVideo whose watch page can be missing (404) or lack ytcfg, and whose continuations can fail
+
+    def __init__(self, *args, **kwargs):
+        super(FlakyVideo, self).__init__(*args, **kwargs)
+        self.watch_page = 'ok'
+        self.broken_tokens = set()
+
+    def watch_html(self, url=None):
+        if self.watch_page == 'missing':
+            return None
+        if self.watch_page == 'no-ytcfg':
+            return '<html><body>Sorry</body></html>'
+        return super(FlakyVideo, self).watch_html(url)
+
+    def response(self, token, client=None, path=None):
+        if token in self.broken_tokens:
+            return None
+        return super(FlakyVideo, self).response(token, client, path)
+
+
+def make_downloader(base_url, **kwargs):
+    # Each downloader gets its own breaker, so a test never trips the process-wide one of another
+    kwargs.setdefault('circuit_breaker', CircuitBreaker())
+    return YoutubeCommentDownloader(base_url=base_url, consent_url=base_url + urlparse(YOUTUBE_CONSENT_URL).path,
+                                    **kwargs)
+
+
+def crawl(downloader, **kwargs):
+    return [comment['cid'] for comment in downloader.get_comments(VIDEO_ID, sleep=0, **kwargs)]
+
+
+def run_cli(base_url, output, *args):
+    argv = ['--base-url', base_url, '-y', VIDEO_ID, '-o', str(output), '--sleep', '0'] + list(args)
+    try:
+        main(argv)
+    except SystemExit as e:
+        return e.code
+    return 0
+
+
+def read_cids(path):
+    with open(path, encoding='utf8') as fp:
+        return [json.loads(line)['cid'] for line in fp]
+
+
+def test_concurrent_crawl_keeps_serial_order(stand_in):
+    video = GeneratedVideo(comments=600, per_page=20, replies=12, reply_page_size=5)
+    _, base_url = stand_in(video)
+
+    serial = crawl(make_downloader(base_url))
+    assert len(serial) == video.total
+    assert crawl(make_downloader(base_url), workers=4) == serial
+
+
+def test_index_dict_matches_search_dict():
+    video = GeneratedVideo(comments=300, per_page=10, replies=12, reply_page_size=5)
+    responses = [video.page(0), video.page(1), video.reply_page('Ugx0000000000', 0),
+                 video.reply_page('Ugx0000000000', 10)]
+    for response in responses:
+        index = CommentParser.index_dict(response, RESPONSE_KEYS)
+        for key in RESPONSE_KEYS:
+            assert index.get(key, []) == list(CommentParser.search_dict(response, key))
+
+
+def test_resume_continues_after_the_checkpoint(stand_in, tmp_path):
+    video = FlakyVideo(comments=600, per_page=20, replies=2)
+    _, base_url = stand_in(video)
+    expected = crawl(make_downloader(base_url))
+    output = tmp_path / 'out.json'
+
+    video.broken_tokens.add('page:3')
+    assert run_cli(base_url, output, '--checkpoint-interval', '1') == 1
+    assert os.path.exists(str(output) + '.checkpoint')
+    written = read_cids(output)
+    assert 0 < len(written) < len(expected)
+
+    video.broken_tokens.clear()
+    assert run_cli(base_url, output, '--checkpoint-interval', '1', '--resume') == 0
+    assert read_cids(output) == expected
+    assert not os.path.exists(str(output) + '.checkpoint')
+
+
+def test_since_state_only_downloads_new_comments(stand_in, tmp_path):
+    video = GeneratedVideo(comments=300, per_page=20, replies=2)
+    _, base_url = stand_in(video)
+    expected = crawl(make_downloader(base_url))
+    state = tmp_path / 'since.json'
+
+    # A previous run that saw the video up to its third thread
+    since = SinceState(str(state))
+    since.set(VIDEO_ID, HighWaterMark([expected[6]]))
+    since.save()
+    assert run_cli(base_url, tmp_path / 'first.json', '--since-state', str(state)) == 0
+    assert read_cids(tmp_path / 'first.json') == expected[:6]
+
+    # The mark now has the newest comments, so nothing is new
+    assert SinceState(str(state)).get(VIDEO_ID).cids[0] == expected[0]
+    assert run_cli(base_url, tmp_path / 'second.json', '--since-state', str(state)) == 0
+    assert read_cids(tmp_path / 'second.json') == []
+
+
+def test_cached_crawl_makes_no_requests(stand_in, tmp_path):
+    video = GeneratedVideo(comments=300, per_page=20, replies=2)
+    scenario, base_url = stand_in(video)
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+
+    first = crawl(make_downloader(base_url, cache=cache))
+    requests_made = scenario.requests
+    assert crawl(make_downloader(base_url, cache=cache)) == first
+    assert scenario.requests == requests_made
+
+
+@pytest.mark.parametrize('watch_page', ['missing', 'no-ytcfg'])
+def test_failed_watch_page_is_not_cached(stand_in, tmp_path, watch_page):
+    video = FlakyVideo(comments=300, per_page=20, replies=2)
+    _, base_url = stand_in(video)
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite'))
+
+    video.watch_page = watch_page
+    with pytest.raises(RuntimeError):
+        crawl(make_downloader(base_url, cache=cache))
+
+    video.watch_page = 'ok'
+    assert len(crawl(make_downloader(base_url, cache=cache))) == video.total
+
+
+def open_breaker():
+    # A breaker that's open and lets a trial request through right away
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    return breaker
+
+
+def fail_first_api_request(downloader, error):
+    post = downloader.session.post
+    calls = []
+
+    def failing_post(url, *args, **kwargs):
+        if '/youtubei/' in url:
+            calls.append(url)
+            if len(calls) == 1:
+                raise error
+        return post(url, *args, **kwargs)
+
+    downloader.session.post = failing_post
+
+
+def test_trial_failing_mid_response_is_a_failed_attempt(stand_in):
+    video = GeneratedVideo(comments=300, per_page=20, replies=2)
+    _, base_url = stand_in(video)
+    breaker = open_breaker()
+    downloader = make_downloader(base_url, circuit_breaker=breaker)
+    fail_first_api_request(downloader, requests.exceptions.ChunkedEncodingError('Connection broken'))
+
+    assert len(crawl(downloader)) == video.total
+    assert not breaker.is_open
+
+
+def test_trial_is_released_on_unexpected_errors(stand_in):
+    video = GeneratedVideo(comments=300, per_page=20, replies=2)
+    _, base_url = stand_in(video)
+    breaker = open_breaker()
+    downloader = make_downloader(base_url, circuit_breaker=breaker)
+    fail_first_api_request(downloader, KeyError('boom'))
+
+    with pytest.raises(KeyError):
+        crawl(downloader)
+    # Without the release the breaker would refuse every request from now on
+    assert len(crawl(downloader)) == video.total
+    assert not breaker.is_open
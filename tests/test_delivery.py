@@ -0,0 +1,75 @@
+import os
+import zipfile
+from urllib.parse import unquote
+
+from djtracks import delivery
+from djtracks.delivery import MAX_STATIC_FILE_SIZE, build_zips, publish, zip_parts
+
+MB = 1024 * 1024
+
+
+def make_file(path, size, sparse=False):
+    with open(path, 'wb') as f:
+        if sparse:
+            f.truncate(size)
+        else:
+            f.write(os.urandom(size))
+    return str(path)
+
+
+def served_path(static_dir, url):
+    # The file Streamlit serves for an app/static/... URL
+    return os.path.join(static_dir, *unquote(url).split('/')[2:])
+
+
+def test_static_dir_is_next_to_the_app():
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(delivery.__file__)))
+    assert delivery.STATIC_DIR == os.path.join(app_dir, 'static')
+    assert os.path.exists(os.path.join(app_dir, 'streamlit_app.py'))
+
+
+def test_publish_copies_when_it_cant_link(tmp_path, monkeypatch):
+    track = make_file(tmp_path / 'Song [dQw4w9WgXcQ].mp3', 1000)
+    static_dir = str(tmp_path / 'static')
+
+    def no_link(source, target):
+        raise OSError('cross-device link')
+
+    monkeypatch.setattr(os, 'link', no_link)
+    url = publish(track, static_dir)
+    target = served_path(static_dir, url)
+    # The static file handler refuses files whose real path is outside the static directory
+    assert not os.path.islink(target)
+    assert os.path.realpath(target).startswith(os.path.realpath(static_dir))
+    with open(target, 'rb') as a, open(track, 'rb') as b:
+        assert a.read() == b.read()
+
+
+def test_large_selection_is_split_under_the_static_file_limit(tmp_path):
+    # 30 tracks of 10MB don't fit in one servable ZIP
+    paths = [make_file(tmp_path / ('Track %02d [dQw4w9WgXcQ].mp3' % i), 10 * MB, sparse=True) for i in range(30)]
+    parts = zip_parts(paths)
+    assert len(parts) == 2
+    assert [path for part in parts for path in part] == paths
+
+
+def test_zip_parts_stay_within_max_size(tmp_path):
+    # The same selection scaled down a thousand times, written out
+    paths = [make_file(tmp_path / ('Track %02d [dQw4w9WgXcQ].mp3' % i), 10 * 1024) for i in range(30)]
+    max_size = MAX_STATIC_FILE_SIZE // 1024
+    zips = build_zips(paths, static_dir=str(tmp_path / 'static'), max_size=max_size)
+    assert [name for _, name in zips] == ['tracks-1-of-2.zip', 'tracks-2-of-2.zip']
+
+    names = []
+    for url, _ in zips:
+        path = served_path(str(tmp_path / 'static'), url)
+        assert os.path.getsize(path) <= max_size
+        with zipfile.ZipFile(path) as archive:
+            names.extend(archive.namelist())
+    assert names == [os.path.basename(path) for path in paths]
+
+
+def test_small_selection_is_one_zip(tmp_path):
+    paths = [make_file(tmp_path / ('Track %d.mp3' % i), 1000) for i in range(3)]
+    zips = build_zips(paths, static_dir=str(tmp_path / 'static'))
+    assert [name for _, name in zips] == ['tracks.zip']
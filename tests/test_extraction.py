@@ -0,0 +1,68 @@
+from djtracks.extraction import MODELS, extract_tracklist, merge_entries, normalize
+from youtube_comment_downloader.cache import ResponseCache
+
+from .helpers import StubClient, tracklist_comments
+
+
+def entry(artist, track, time=''):
+    return {'artist': artist, 'track': track, 'version': '', 'label': '', 'time': time}
+
+
+def extract(client, comments, cache=None):
+    return extract_tracklist(client, comments, chunk_tokens=200, workers=4, cache=cache)
+
+
+def test_merge_entries_order():
+    batches = [[entry('C', 'c'), entry('B', 'b', '10:00')],
+               [entry('A', 'a', '1:00:00'), entry('D', 'd'), entry('b', 'B!', '2:00')]]
+    merged = merge_entries(batches)
+    # Timestamped entries first, by time (the earliest of duplicates), then the rest in the order they came in
+    assert [(item['artist'], item['time']) for item in merged] == [('B', '2:00'), ('A', '1:00:00'), ('C', ''),
+                                                                   ('D', '')]
+    reordered = merge_entries(list(reversed(batches)))
+    assert [(normalize(item['artist']), item['time']) for item in reordered] == [('b', '2:00'), ('a', '1:00:00'),
+                                                                                 ('d', ''), ('c', '')]
+
+
+def test_tracklist_is_deterministic():
+    comments, expected = tracklist_comments(500, 30)
+    first = extract(StubClient(), comments)
+    assert first['chunks'] > 1 and first['failed'] == 0
+    # The synthetic tracks are numbered in the order they're played
+    names = ['%s - %s' % (item['artist'], item['track']) for item in first['tracks']]
+    assert names and names == [line for line in expected if line in names]
+    for _ in range(3):
+        assert extract(StubClient(), comments)['tracks'] == first['tracks']
+
+
+def test_failed_chunks_fall_back_to_next_model():
+    comments, _ = tracklist_comments(500, 30)
+    client = StubClient(failing=[MODELS[0]])
+    result = extract(client, comments)
+    assert result['failed'] == 0
+    assert result['models'] == [MODELS[1]]
+    assert client.requests == 2 * result['chunks']
+    assert result['tracks'] == extract(StubClient(), comments)['tracks']
+
+
+def test_results_are_cached(tmp_path):
+    comments, _ = tracklist_comments(500, 30)
+    cache = ResponseCache(str(tmp_path / 'results.sqlite'))
+    first = extract(StubClient(), comments, cache=cache)
+
+    client = StubClient()
+    second = extract(client, comments, cache=cache)
+    assert client.requests == 0
+    assert second['tracks'] == first['tracks']
+
+
+def test_fallback_results_are_not_cached(tmp_path):
+    comments, _ = tracklist_comments(500, 30)
+    cache = ResponseCache(str(tmp_path / 'results.sqlite'))
+    extract(StubClient(failing=[MODELS[0]]), comments, cache=cache)
+
+    # Once the first model answers again, it's asked rather than the fallback answers reused
+    client = StubClient()
+    result = extract(client, comments, cache=cache)
+    assert result['models'] == [MODELS[0]]
+    assert client.requests == result['chunks']
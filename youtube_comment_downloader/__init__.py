@@ -1,21 +1,42 @@
 import argparse
-import io
-import json
 import os
 import sys
 import time
 
-from .downloader import YoutubeCommentDownloader, SORT_BY_POPULAR, SORT_BY_RECENT
+from .writers import (ARROW_COMPRESSIONS, COMPRESSIONS, FORMATS, INDENT, Progress, guess_compression, open_writer,
+                      to_json)
 
-INDENT = 4
 
+def __getattr__(name):
+    # The downloader (and requests) is only imported once it's needed, which keeps `--help` fast
+    if name in ('YoutubeCommentDownloader', 'SORT_BY_POPULAR', 'SORT_BY_RECENT'):
+        from . import downloader
+        return getattr(downloader, name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
 
-def to_json(comment, indent=None):
-    comment_str = json.dumps(comment, ensure_ascii=False, indent=indent)
-    if indent is None:
-        return comment_str
-    padding = ' ' * (2 * indent) if indent else ''
-    return ''.join(padding + line for line in comment_str.splitlines(True))
+
+def write_comments(comments, writer, limit=None, progress=None):
+    # Writes comments to one of the writers from .writers and returns how many were written
+    count = 0
+    for comment in comments:
+        writer.write(comment)
+        count += 1
+        if progress:
+            progress.update(count)
+        if limit and count >= limit:
+            break
+    if progress:
+        progress.update(count, force=True)
+    return count
+
+
+def dump_stats(stats, path):
+    # Writes the crawl stats as JSON to a file, or to stdout for '-'
+    if path == '-':
+        print(stats.to_json())
+    else:
+        with open(path, 'w', encoding='utf8') as fp:
+            fp.write(stats.to_json() + '\n')
 
 
 def main(argv = None):
@@ -23,11 +44,49 @@ def main(argv = None):
     parser.add_argument('--help', '-h', action='help', default=argparse.SUPPRESS, help='Show this help message and exit')
     parser.add_argument('--youtubeid', '-y', help='ID of Youtube video for which to download the comments')
     parser.add_argument('--url', '-u', help='Youtube URL for which to download the comments')
-    parser.add_argument('--output', '-o', help='Output filename (output format is line delimited JSON)')
+    parser.add_argument('--output', '-o', help='Output filename (line delimited JSON unless --format is given), '
+                                               'or output directory when using --input-list')
+    parser.add_argument('--input-list', '-i', help='File with Youtube IDs/URLs (one per line) to download in one go')
+    parser.add_argument('--jobs', '-j', type=int, default=4,
+                        help='Number of videos downloaded in parallel when using --input-list. Defaults to 4')
     parser.add_argument('--pretty', '-p', action='store_true', help='Change the output format to indented JSON')
+    parser.add_argument('--format', '-f', choices=FORMATS, default='json',
+                        help='Output format: line delimited JSON (default), Parquet or Arrow IPC stream')
+    parser.add_argument('--compress', '-c', choices=COMPRESSIONS, default=None,
+                        help='Compress the output. Defaults to gzip/zstd for .gz/.zst filenames. '
+                             'Arrow output can only be compressed with zstd')
     parser.add_argument('--limit', '-l', type=int, help='Limit the number of comments')
+    parser.add_argument('--max-pages', type=int, default=None, help='Stop after fetching this many comment pages')
+    parser.add_argument('--deadline', type=float, default=None, help='Stop fetching new pages after this many seconds')
+    parser.add_argument('--no-replies', action='store_true', help='Skip reply threads and only download top-level comments')
+    parser.add_argument('--sleep', type=float, default=0.1,
+                        help='Seconds to wait between pages when not using --workers. Defaults to 0.1')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help='Number of threads used to fetch pages and reply threads concurrently')
+    parser.add_argument('--rate-limit', type=float, default=None, help='Maximum number of requests per second')
+    parser.add_argument('--cache', type=str, default=None,
+                        help='Cache watch pages and comment pages in this file and replay them on later runs')
+    parser.add_argument('--cache-ttl', type=float, default=24,
+                        help='Number of hours cached responses stay valid. Defaults to 24')
+    parser.add_argument('--since-state', type=str, default=None,
+                        help='Only download comments posted since the previous run, which is tracked in this file')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume an interrupted download from its checkpoint, appending to the output file')
+    parser.add_argument('--checkpoint-interval', type=int, default=10,
+                        help='Save a checkpoint every this many pages (0 to disable). Defaults to 10')
+    parser.add_argument('--no-time-parsed', action='store_true',
+                        help='Don\'t add parsed timestamps (time_parsed) to the comments')
+    parser.add_argument('--stats', nargs='?', const='-', default=None, metavar='FILE',
+                        help='Dump crawl statistics (requests, bytes, latencies, time per stage) as JSON to this file, '
+                             'or to stdout if no file is given')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='Serve crawl statistics in the Prometheus text format at http://localhost:PORT/metrics')
+    parser.add_argument('--metrics-host', default='127.0.0.1',
+                        help='Address the --metrics-port server listens on. Defaults to 127.0.0.1 (this machine only)')
+    parser.add_argument('--base-url', type=str, default=None,
+                        help='Talk to a YouTube stand-in at this URL (e.g. http://127.0.0.1:8080) instead of YouTube')
     parser.add_argument('--language', '-a', type=str, default=None, help='Language for Youtube generated text (e.g. en)')
-    parser.add_argument('--sort', '-s', type=int, default=SORT_BY_RECENT,
+    parser.add_argument('--sort', '-s', type=int, default=None,
                         help='Whether to download popular (0) or recent comments (1). Defaults to 1')
 
     try:
@@ -39,45 +98,113 @@ def main(argv = None):
         limit = args.limit
         pretty = args.pretty
 
-        if (not youtube_id and not youtube_url) or not output:
+        if (not youtube_id and not youtube_url and not args.input_list) or not output:
             parser.print_usage()
-            raise ValueError('you need to specify a Youtube ID/URL and an output filename')
+            raise ValueError('you need to specify a Youtube ID/URL (or an input list) and an output filename')
 
-        if os.sep in output:
+        compression = args.compress or (guess_compression(output) if not args.input_list else None)
+        if args.format == 'arrow' and compression not in (None,) + ARROW_COMPRESSIONS:
+            raise ValueError('arrow output can only be compressed with %s' % ', '.join(ARROW_COMPRESSIONS))
+
+        if os.sep in output and not args.input_list:
             outdir = os.path.dirname(output)
             if not os.path.exists(outdir):
                 os.makedirs(outdir)
 
-        print('Downloading Youtube comments for', youtube_id or youtube_url)
-        downloader = YoutubeCommentDownloader()
-        generator = (
-            downloader.get_comments(youtube_id, args.sort, args.language)
-            if youtube_id
-            else downloader.get_comments_from_url(youtube_url, args.sort, args.language)
-        )
-
-        count = 1
-        with io.open(output, 'w', encoding='utf8') as fp:
-            sys.stdout.write('Downloaded %d comment(s)\r' % count)
-            sys.stdout.flush()
+        from .cache import ResponseCache
+        from .downloader import YoutubeCommentDownloader, SORT_BY_RECENT
+        from .incremental import HighWaterMark, SinceState, track_newest
+        sort_by = SORT_BY_RECENT if args.sort is None else args.sort
+        cache = ResponseCache(args.cache, ttl=args.cache_ttl * 3600) if args.cache else None
+        since_state = SinceState(args.since_state) if args.since_state else None
+        if since_state is not None and sort_by != SORT_BY_RECENT:
+            raise ValueError('--since-state only works with recent comments (--sort 1)')
+
+        stats = None
+        if args.stats or args.metrics_port:
+            from .stats import CrawlStats, serve_metrics
+            stats = CrawlStats()
+            if args.metrics_port:
+                serve_metrics(stats, args.metrics_port, args.metrics_host)
+
+        urls = {}
+        if args.base_url:
+            from urllib.parse import urlparse
+            from .downloader import YOUTUBE_CONSENT_URL
+            # The stand-in serves the consent form on its own host
+            urls = {'base_url': args.base_url,
+                    'consent_url': args.base_url.rstrip('/') + urlparse(YOUTUBE_CONSENT_URL).path}
+
+        def make_downloader():
+            return YoutubeCommentDownloader(rate_limit=args.rate_limit, cache=cache, stats=stats, **urls)
+
+        def options(video):
+            return {'limit': limit or None,
+                    'max_pages': args.max_pages,
+                    'deadline': time.time() + args.deadline if args.deadline is not None else None,
+                    'replies': not args.no_replies,
+                    'workers': args.workers,
+                    'sleep': args.sleep,
+                    'parse_time': not args.no_time_parsed,
+                    'since': since_state.get(video) if since_state else None}
+
+        if args.input_list:
+            from .batch import download_batch
+            failed = download_batch(args.input_list, output, make_downloader, sort_by, args.language, options,
+                                    limit=limit, jobs=args.jobs, since_state=since_state, format=args.format,
+                                    pretty=pretty, compression=args.compress)
+            if args.stats:
+                dump_stats(stats, args.stats)
+            if failed:
+                sys.exit(1)
+            return
+
+        from .checkpoint import Checkpoint, truncate_lines
+        from .downloader import WATCH_PATH, YOUTUBE_URL
+        if not youtube_url:
+            youtube_url = (args.base_url or YOUTUBE_URL).rstrip('/') + WATCH_PATH.format(youtube_id=youtube_id)
+        checkpoint = None
+        if (args.checkpoint_interval > 0 and args.format == 'json' and not pretty and not compression
+                and not (args.workers and args.workers > 1)):
+            checkpoint = Checkpoint(output + '.checkpoint', interval=args.checkpoint_interval)
+        elif args.resume:
+            raise ValueError('--resume needs uncompressed line delimited JSON output and no --workers')
+
+        resume = args.resume and checkpoint.resumable(youtube_url, sort_by) and os.path.exists(output)
+        if resume:
+            # Drop anything written after the last checkpoint, the crawl picks up from there
+            truncate_lines(output, checkpoint.emitted)
+            print('Resuming download of Youtube comments for', youtube_id or youtube_url,
+                  'after %d comment(s)' % checkpoint.emitted)
+        else:
+            if checkpoint is not None:
+                checkpoint.remove()
+            print('Downloading Youtube comments for', youtube_id or youtube_url)
+
+        downloader = make_downloader()
+        video_options = options(youtube_id or youtube_url)
+        generator = downloader.get_comments_from_url(youtube_url, sort_by, args.language, checkpoint=checkpoint,
+                                                     **video_options)
+        newest = []
+        if since_state is not None:
+            generator = track_newest(generator, newest)
+
+        with open_writer(output, args.format, pretty=pretty, compression=compression, append=resume) as writer:
+            if checkpoint is not None:
+                checkpoint.before_save = writer.flush
             start_time = time.time()
-
-            if pretty:
-                fp.write('{\n' + ' ' * INDENT + '"comments": [\n')
-
-            comment = next(generator, None)
-            while comment:
-                comment_str = to_json(comment, indent=INDENT if pretty else None)
-                comment = None if limit and count >= limit else next(generator, None)  # Note that this is the next comment
-                comment_str = comment_str + ',' if pretty and comment is not None else comment_str
-                print(comment_str.decode('utf-8') if isinstance(comment_str, bytes) else comment_str, file=fp)
-                sys.stdout.write('Downloaded %d comment(s)\r' % count)
-                sys.stdout.flush()
-                count += 1
-
-            if pretty:
-                fp.write(' ' * INDENT +']\n}')
+            # The downloader enforces the limit, counting the comments written before resuming
+            write_comments(generator, writer, progress=Progress())
         print('\n[{:.2f} seconds] Done!'.format(time.time() - start_time))
+        if args.stats:
+            dump_stats(stats, args.stats)
+        if checkpoint is not None:
+            checkpoint.remove()
+
+        if since_state is not None:
+            mark = video_options['since'] or HighWaterMark()
+            since_state.set(youtube_id or youtube_url, mark.advance(newest))
+            since_state.save()
 
     except Exception as e:
         print('Error:', str(e))
@@ -0,0 +1,193 @@
+import asyncio
+import time
+from urllib.parse import urlparse
+
+import httpx
+
+from .downloader import CommentParser, SORT_BY_RECENT, USER_AGENT, WATCH_PATH, YOUTUBE_CONSENT_URL, YOUTUBE_URL
+from .ratelimit import shared_rate_limiter
+from .records import Comment
+from .retry import RetryPolicy, circuit_breaker, parse_retry_after
+
+
+class AsyncYoutubeCommentDownloader(CommentParser):
+    # asyncio counterpart of YoutubeCommentDownloader. All requests go through a single pooled client, so many
+    # videos can be crawled from one event loop:
+    #
+    #     async with AsyncYoutubeCommentDownloader() as downloader:
+    #         async for comment in downloader.get_comments_from_url(url):
+    #             ...
+
+    def __init__(self, rate_limit=None, max_connections=100, client=None, retry_policy=None, circuit_breaker=None,
+                 base_url=YOUTUBE_URL, consent_url=YOUTUBE_CONSENT_URL):
+        if client is None:
+            client = httpx.AsyncClient(headers={'User-Agent': USER_AGENT},
+                                       follow_redirects=True,
+                                       limits=httpx.Limits(max_connections=max_connections))
+        self.client = client
+        self.client.cookies.set('CONSENT', 'YES+cb', domain='.youtube.com')
+        # Maximum number of requests per second sent to each host, shared by all downloaders in this process
+        self.rate_limiter = shared_rate_limiter(rate_limit) if rate_limit else None
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Defaults to a process-wide breaker per host
+        self.circuit_breaker = circuit_breaker
+        self.base_url = base_url.rstrip('/')
+        self.consent_url = consent_url
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def ajax_request(self, endpoint, ytcfg, retries=None, sleep=None, timeout=60):
+        # retries defaults to the retry policy's; a fixed `sleep` replaces its backoff
+        url = self.base_url + endpoint['commandMetadata']['webCommandMetadata']['apiUrl']
+
+        data = {'context': ytcfg['INNERTUBE_CONTEXT'],
+                'continuation': endpoint['continuationCommand']['token']}
+
+        retries = self.retry_policy.retries if retries is None else retries
+        breaker = self.circuit_breaker or circuit_breaker(urlparse(url).netloc)
+        error = None
+        for attempt in range(retries):
+            breaker.check()
+            retry_after = None
+            try:
+                if self.rate_limiter:
+                    await asyncio.sleep(self.rate_limiter.reserve(url))
+                try:
+                    response = await self.client.post(url, params={'key': ytcfg['INNERTUBE_API_KEY']}, json=data,
+                                                      timeout=timeout)
+                except (httpx.TransportError, httpx.DecodingError) as e:
+                    error = type(e).__name__
+                else:
+                    if response.status_code == 200:
+                        try:
+                            result = response.json()
+                        except ValueError:
+                            error = 'Invalid JSON response'
+                        else:
+                            breaker.record_success()
+                            return result
+                    elif response.status_code in [403, 413]:
+                        breaker.record_success()
+                        return {}
+                    else:
+                        if response.status_code in [429, 503]:
+                            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                        error = 'HTTP %d' % response.status_code
+            except BaseException:
+                # Cancelled (CancelledError is a BaseException) or an unexpected error: a trial request has to
+                # be given back
+                breaker.release()
+                raise
+            breaker.record_failure()
+            if attempt + 1 < retries:
+                await asyncio.sleep(sleep if sleep is not None else self.retry_policy.delay(attempt, retry_after))
+        raise RuntimeError('Request to %s failed after %d attempts (%s)' % (url, retries, error))
+
+    def get_comments(self, youtube_id, *args, **kwargs):
+        return self.get_comments_from_url(self.base_url + WATCH_PATH.format(youtube_id=youtube_id), *args, **kwargs)
+
+    async def get_comments_from_url(self, youtube_url, sort_by=SORT_BY_RECENT, language=None, sleep=.1,
+                                    limit=None, max_pages=None, deadline=None, replies=True, workers=None,
+                                    parse_time=True, compact=False):
+        # Takes the same options as YoutubeCommentDownloader.get_comments_from_url. With workers > 1, reply
+        # threads are fetched concurrently, at most `workers` requests at a time.
+        if limit is not None and limit <= 0:
+            return
+
+        response = await self.client.get(youtube_url)
+
+        if 'consent' in str(response.url):
+            # We may get redirected to a separate page for cookie consent. If this happens we agree automatically.
+            response = await self.client.post(self.consent_url,
+                                              params=self.consent_params(response.text, youtube_url))
+
+        ytcfg, data = self.parse_watch_page(response.text, language)
+        if not ytcfg:
+            return  # Unable to extract configuration
+        if not self.has_comments(data):
+            # Comments disabled?
+            return
+
+        sort_menu = self.sort_menu(data)
+        if not sort_menu:
+            # No sort menu. Maybe this is a request for community posts?
+            continuation = self.sort_menu_continuation(data)
+            # Retry..
+            data = await self.ajax_request(continuation, ytcfg) if continuation else {}
+            sort_menu = self.sort_menu(data)
+        continuation = self.sort_endpoint(sort_menu, sort_by)
+
+        comments = self._crawl(continuation, ytcfg, sleep, max_pages, deadline, replies, workers or 1,
+                               parse_time and not compact)
+        language = ytcfg['INNERTUBE_CONTEXT']['client'].get('hl')
+        count = 0
+        try:
+            async for comment in comments:
+                yield Comment.from_dict(comment, parse_time, language, time.time()) if compact else comment
+                count += 1
+                if limit is not None and count >= limit:
+                    return
+        finally:
+            await comments.aclose()
+
+    async def _crawl(self, first_continuation, ytcfg, sleep, max_pages, deadline, replies, workers, parse_time):
+        # Same traversal order as the sync crawl: a page, the replies of each of its threads, then the next page.
+        # Reply threads and the next page are scheduled as tasks as soon as their page has been parsed.
+        language = ytcfg['INNERTUBE_CONTEXT']['client'].get('hl')
+        semaphore = asyncio.Semaphore(workers)
+        budget = {'pages': 0}
+
+        async def fetch(continuation):
+            if max_pages is not None and budget['pages'] >= max_pages:
+                return None
+            if deadline is not None and time.time() >= deadline:
+                return None
+            budget['pages'] += 1
+            async with semaphore:
+                response = await self.ajax_request(continuation, ytcfg)
+                if workers == 1:
+                    await asyncio.sleep(sleep)
+                return response
+
+        async def fetch_thread(continuation):
+            thread_comments = []
+            stack = [continuation]
+            while stack:
+                response = await fetch(stack.pop())
+                if not response:
+                    break
+                comments, _, _, reply_continuations = self.parse_response(response, replies, parse_time, language)
+                thread_comments.extend(comments)
+                stack.extend(reply_continuations[::-1])
+            return thread_comments
+
+        tasks = []
+        try:
+            page = asyncio.ensure_future(fetch(first_continuation))
+            tasks.append(page)
+            while page is not None:
+                response = await page
+                if not response:
+                    break
+
+                comments, page_continuations, thread_continuations, _ = \
+                    self.parse_response(response, replies, parse_time, language)
+                threads = [asyncio.ensure_future(fetch_thread(continuation)) for continuation in thread_continuations]
+                page = asyncio.ensure_future(fetch(page_continuations[0])) if page_continuations else None
+                tasks = threads + ([page] if page else [])
+
+                for comment in comments:
+                    yield comment
+                for thread in threads:
+                    for comment in await thread:
+                        yield comment
+        finally:
+            for task in tasks:
+                task.cancel()
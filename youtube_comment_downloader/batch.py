@@ -0,0 +1,113 @@
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import write_comments
+from .incremental import HighWaterMark, track_newest
+from .writers import open_writer
+
+EXTENSIONS = {'json': '.json', 'parquet': '.parquet', 'arrow': '.arrow', 'gzip': '.gz', 'zstd': '.zst'}
+
+YOUTUBE_ID_RE = r'^[A-Za-z0-9_-]{11}$'
+YOUTUBE_URL_ID_RE = r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/)([A-Za-z0-9_-]{11})'
+
+
+def read_input_list(path):
+    # Returns (youtube_id, youtube_url) pairs, skipping blank lines and comments
+    videos = []
+    with io.open(path, encoding='utf8') as fp:
+        for line in fp:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if re.match(YOUTUBE_ID_RE, line):
+                videos.append((line, None))
+            else:
+                match = re.search(YOUTUBE_URL_ID_RE, line)
+                videos.append((match.group(1) if match else None, line))
+    return videos
+
+
+def output_filename(youtube_id, youtube_url, format='json', compression=None):
+    name = youtube_id or hashlib.sha1(youtube_url.encode('utf-8')).hexdigest()[:16]
+    # Parquet/Arrow compress internally
+    return name + EXTENSIONS[format] + (EXTENSIONS[compression] if compression and format == 'json' else '')
+
+
+def download_batch(input_list, outdir, make_downloader, sort_by, language, options, limit=None, jobs=4,
+                   since_state=None, format='json', pretty=False, compression=None):
+    # Downloads every video in input_list to its own file in outdir and returns the videos that failed.
+    # Output is written to a .part file that's only renamed once the video is done, so a restarted batch
+    # skips the videos that were completed.
+    if not os.path.exists(outdir):
+        os.makedirs(outdir)
+
+    entries = read_input_list(input_list)
+    videos = []
+    for youtube_id, youtube_url in entries:
+        path = os.path.join(outdir, output_filename(youtube_id, youtube_url, format, compression))
+        if since_state is not None or not os.path.exists(path):
+            videos.append((youtube_id, youtube_url, path))
+    skipped = len(entries) - len(videos)
+    print('Downloading Youtube comments for %d video(s)%s' %
+          (len(videos), ' (%d already done)' % skipped if skipped else ''))
+
+    local = threading.local()
+    state_lock = threading.Lock()
+
+    def download(youtube_id, youtube_url, path):
+        # Each worker thread keeps its own downloader, and with it its connection pool
+        if not hasattr(local, 'downloader'):
+            local.downloader = make_downloader()
+        video = youtube_id or youtube_url
+        video_options = options(video)
+        generator = (local.downloader.get_comments(youtube_id, sort_by, language, **video_options)
+                     if youtube_id else
+                     local.downloader.get_comments_from_url(youtube_url, sort_by, language, **video_options))
+        newest = []
+        if since_state is not None:
+            generator = track_newest(generator, newest)
+
+        start_time = time.time()
+        part = path + '.part'
+        try:
+            with open_writer(part, format, pretty=pretty, compression=compression) as writer:
+                count = write_comments(generator, writer, limit=limit)
+        except BaseException:
+            # A failed video is downloaded again from scratch, so its partial output is of no use
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+        os.replace(part, path)
+
+        if since_state is not None:
+            with state_lock:
+                since_state.set(video, (video_options['since'] or HighWaterMark()).advance(newest))
+                since_state.save()
+        return count, time.time() - start_time
+
+    total = 0
+    failed = []
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {pool.submit(download, *video): video for video in videos}
+        for future in as_completed(futures):
+            youtube_id, youtube_url, _ = futures[future]
+            try:
+                count, seconds = future.result()
+            except Exception as e:
+                failed.append(youtube_id or youtube_url)
+                print('%s: failed (%s)' % (youtube_id or youtube_url, e))
+                continue
+            total += count
+            print('%s: %d comment(s) in %.2fs (%.1f comments/s)' %
+                  (youtube_id or youtube_url, count, seconds, count / seconds if seconds else 0))
+
+    seconds = time.time() - start_time
+    print('[{:.2f} seconds] Done! {} comment(s) from {} video(s), {:.1f} comments/s, {} failed'.format(
+        seconds, total, len(videos) - len(failed), total / seconds if seconds else 0, len(failed)))
+    return failed
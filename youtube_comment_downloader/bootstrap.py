@@ -0,0 +1,77 @@
+import json
+import re
+
+# Where the two objects the downloader needs start on a watch page
+YT_CFG_START_RE = re.compile(r'ytcfg\.set\s*\(\s*(?={)')
+YT_INITIAL_DATA_START_RE = re.compile(r'(?:window\s*\[\s*["\']ytInitialData["\']\s*\]|ytInitialData)\s*=\s*(?={)')
+# Literal part of each marker, found with str.find before the regex is tried (and how far before it a match
+# can start)
+MARKER_HINTS = {'ytcfg': ('ytcfg', 0), 'data': ('ytInitialData', 16)}
+# Both are inline scripts, and JSON in a script can't contain '</script' (YouTube escapes '<' in strings), so an
+# object is complete once this follows its start
+SCRIPT_END = '</script'
+# Kept from the end of the scanned text, so a marker split between two chunks is still found
+MARKER_TAIL = 64
+
+_decoder = json.JSONDecoder()
+
+
+def _find_marker(buffer, name, regex):
+    hint, before = MARKER_HINTS[name]
+    position = buffer.find(hint)
+    while position != -1:
+        match = regex.search(buffer, max(position - before, 0), position + MARKER_TAIL)
+        if match:
+            return match
+        position = buffer.find(hint, position + 1)
+    return None
+
+
+def scan_watch_page(chunks, ytcfg=True):
+    """Extracts ytcfg and ytInitialData from a watch page given as an iterable of text chunks.
+
+    Reading stops as soon as both objects (or only ytInitialData, if `ytcfg` is False) are found, so the rest
+    of the page never has to be downloaded. Each object is decoded right where it starts with the JSON decoder,
+    which finds its balanced end, instead of first cutting it out with a regex. Returns (ytcfg, data) like
+    CommentParser.parse_watch_page, with None/{} for objects that weren't found.
+    """
+    markers = {'data': YT_INITIAL_DATA_START_RE}
+    if ytcfg:
+        markers['ytcfg'] = YT_CFG_START_RE
+    found = {}
+    buffer = ''
+    pending = None  # (name, offset) of an object whose end hasn't arrived yet
+    chunks = iter(chunks)
+    exhausted = False
+    while not exhausted and len(found) < len(markers):
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+        else:
+            buffer += chunk
+
+        while len(found) < len(markers):
+            if pending is None:
+                matches = [(match.end(), name) for name, regex in markers.items() if name not in found
+                           for match in [_find_marker(buffer, name, regex)] if match]
+                if not matches:
+                    buffer = buffer[-MARKER_TAIL:]
+                    break
+                start, name = min(matches)
+                buffer = buffer[start:]
+                pending = (name, 0)
+
+            name, start = pending
+            if not exhausted and buffer.find(SCRIPT_END, start) == -1:
+                break
+            try:
+                value, end = _decoder.raw_decode(buffer, start)
+            except ValueError:
+                # Not valid JSON after all, look for the next marker
+                value, end = None, start + 1
+            if value is not None:
+                found[name] = value
+            pending = None
+            buffer = buffer[end:]
+
+    return found.get('ytcfg'), found.get('data') or {}
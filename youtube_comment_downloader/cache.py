@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+def cache_key(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ResponseCache(object):
+    """On-disk cache of JSON-serializable values.
+
+    Values are stored zlib-compressed in a single SQLite file, expire after `ttl` seconds (None to keep them
+    forever) and the least recently used ones are evicted once the compressed total exceeds `max_size` bytes.
+    The file can be shared between threads and processes.
+    """
+
+    def __init__(self, path, ttl=24 * 3600, max_size=256 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                         'size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT value, created FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return default
+            if self.ttl is not None and now - row[1] > self.ttl:
+                self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                return default
+            self._db.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def set(self, key, value):
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)', (key, blob, len(blob), now, now))
+            self._evict(now)
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM entries')
+
+    def size(self):
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _evict(self, now):
+        if self.ttl is not None:
+            self._db.execute('DELETE FROM entries WHERE created < ?', (now - self.ttl,))
+        if self.max_size is None:
+            return
+        excess = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0] - self.max_size
+        if excess <= 0:
+            return
+        evicted = []
+        for key, size in self._db.execute('SELECT key, size FROM entries ORDER BY accessed'):
+            evicted.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany('DELETE FROM entries WHERE key = ?', evicted)
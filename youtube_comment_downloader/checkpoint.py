@@ -0,0 +1,63 @@
+import json
+import os
+
+
+class Checkpoint(object):
+    # State file from which an interrupted crawl can be resumed: the pending continuations, the ytcfg they
+    # belong to and the number of comments emitted so far. It's written every `interval` pages, after all
+    # comments of the previous page have been handed to the consumer. `before_save` is called right before
+    # writing, e.g. to flush the output so it's never behind the checkpoint.
+
+    def __init__(self, path, interval=10, before_save=None):
+        self.path = path
+        self.interval = interval
+        self.before_save = before_save
+        self.state = None
+        self._pages = 0
+        if os.path.exists(path):
+            with open(path, encoding='utf8') as fp:
+                self.state = json.load(fp)
+
+    @property
+    def emitted(self):
+        return self.state['emitted'] if self.state else 0
+
+    def resumable(self, youtube_url, sort_by):
+        return bool(self.state) and self.state['url'] == youtube_url and self.state['sort_by'] == sort_by
+
+    def start(self, youtube_url, sort_by, ytcfg):
+        self.state = {'url': youtube_url, 'sort_by': sort_by, 'ytcfg': ytcfg, 'continuations': [], 'emitted': 0}
+
+    def comment_emitted(self):
+        self.state['emitted'] += 1
+
+    def update(self, continuations, force=False):
+        if force or self._pages % self.interval == 0:
+            self.state['continuations'] = list(continuations)
+            self.save()
+        self._pages += 1
+
+    def save(self):
+        if self.before_save:
+            self.before_save()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf8') as fp:
+            json.dump(self.state, fp)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        self.state = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def truncate_lines(path, count):
+    # Cuts a line delimited file down to its first `count` lines, dropping whatever was written after the checkpoint
+    with open(path, 'r+b') as fp:
+        offset = 0
+        for _ in range(count):
+            line = fp.readline()
+            if not line:
+                break
+            offset += len(line)
+        fp.truncate(offset)
@@ -1,13 +1,26 @@
 from __future__ import print_function
 
+import codecs
+import copy
 import json
 import re
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlparse
 
-import dateparser
 import requests
 
-YOUTUBE_VIDEO_URL = 'https://www.youtube.com/watch?v={youtube_id}'
+from .bootstrap import scan_watch_page
+from .cache import cache_key
+from .ratelimit import shared_rate_limiter
+from .records import compact_comments
+from .retry import RetryPolicy, circuit_breaker, parse_retry_after
+from .timeparse import parse_time as parse_published_time
+
+YOUTUBE_URL = 'https://www.youtube.com'
+WATCH_PATH = '/watch?v={youtube_id}'
+YOUTUBE_VIDEO_URL = YOUTUBE_URL + WATCH_PATH
 YOUTUBE_CONSENT_URL = 'https://consent.youtube.com/save'
 
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.130 Safari/537.36'
@@ -19,133 +32,154 @@ YT_CFG_RE = r'ytcfg\.set\s*\(\s*({.+?})\s*\)\s*;'
 YT_INITIAL_DATA_RE = r'(?:window\s*\[\s*["\']ytInitialData["\']\s*\]|ytInitialData)\s*=\s*({.+?})\s*;\s*(?:var\s+meta|</script|\n)'
 YT_HIDDEN_INPUT_RE = r'<input\s+type="hidden"\s+name="([A-Za-z0-9_]+)"\s+value="([A-Za-z0-9_\-\.]*)"\s*(?:required|)\s*>'
 
+# Watch pages are read in chunks of this many bytes, and only up to where ytInitialData ends
+WATCH_PAGE_CHUNK_SIZE = 64 * 1024
+# How long the ytcfg of the first watch page is reused for later videos in the same session
+YTCFG_TTL = 3600
 
-class YoutubeCommentDownloader:
+# Keys looked up in every continuation response, collected in a single pass by index_dict
+RESPONSE_KEYS = ('externalErrorMessage',
+                 'reloadContinuationItemsCommand',
+                 'appendContinuationItemsAction',
+                 'commentSurfaceEntityPayload',
+                 'commentViewModel',
+                 'engagementToolbarStateEntityPayload',
+                 'commentEntityPayload')
 
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers['User-Agent'] = USER_AGENT
-        self.session.cookies.set('CONSENT', 'YES+cb', domain='.youtube.com')
 
-    def ajax_request(self, endpoint, ytcfg, retries=5, sleep=20, timeout=60):
-        url = 'https://www.youtube.com' + endpoint['commandMetadata']['webCommandMetadata']['apiUrl']
+def received_size(response):
+    # Body bytes received for a response, before any Content-Encoding is undone. urllib3 counts them as it
+    # reads the body; without that (e.g. a stubbed response), Content-Length tells the size sent.
+    try:
+        return response.raw.tell()
+    except (AttributeError, OSError, ValueError):
+        return int(response.headers.get('Content-Length') or 0)
 
-        data = {'context': ytcfg['INNERTUBE_CONTEXT'],
-                'continuation': endpoint['continuationCommand']['token']}
 
-        for _ in range(retries):
-            try:
-                response = self.session.post(url, params={'key': ytcfg['INNERTUBE_API_KEY']}, json=data, timeout=timeout)
-                if response.status_code == 200:
-                    return response.json()
-                if response.status_code in [403, 413]:
-                    return {}
-            except requests.exceptions.Timeout:
-                pass
-            time.sleep(sleep)
-
-    def get_comments(self, youtube_id, *args, **kwargs):
-        return self.get_comments_from_url(YOUTUBE_VIDEO_URL.format(youtube_id=youtube_id), *args, **kwargs)
+class CommentParser(object):
+    # Parsing shared by the sync and async downloaders, which only differ in how they do I/O.
 
-    def get_comments_from_url(self, youtube_url, sort_by=SORT_BY_RECENT, language=None, sleep=.1):
-        response = self.session.get(youtube_url)
+    # Optional CrawlStats that parse_response reports its time to
+    stats = None
 
-        if 'consent' in str(response.url):
-            # We may get redirected to a separate page for cookie consent. If this happens we agree automatically.
-            params = dict(re.findall(YT_HIDDEN_INPUT_RE, response.text))
-            params.update({'continue': youtube_url, 'set_eom': False, 'set_ytc': True, 'set_apyt': True})
-            response = self.session.post(YOUTUBE_CONSENT_URL, params=params)
+    def consent_params(self, html, youtube_url):
+        params = dict(re.findall(YT_HIDDEN_INPUT_RE, html))
+        params.update({'continue': youtube_url, 'set_eom': False, 'set_ytc': True, 'set_apyt': True})
+        return params
 
-        html = response.text
-        ytcfg = json.loads(self.regex_search(html, YT_CFG_RE, default=''))
+    def parse_watch_page(self, html, language=None):
+        ytcfg = json.loads(self.regex_search(html, YT_CFG_RE, default='null'))
         if not ytcfg:
-            return  # Unable to extract configuration
+            return None, None
         if language:
             ytcfg['INNERTUBE_CONTEXT']['client']['hl'] = language
 
-        data = json.loads(self.regex_search(html, YT_INITIAL_DATA_RE, default=''))
+        data = json.loads(self.regex_search(html, YT_INITIAL_DATA_RE, default='null')) or {}
+        return ytcfg, data
 
+    def has_comments(self, data):
         item_section = next(self.search_dict(data, 'itemSectionRenderer'), None)
         renderer = next(self.search_dict(item_section, 'continuationItemRenderer'), None) if item_section else None
-        if not renderer:
-            # Comments disabled?
-            return
+        return renderer is not None
 
-        sort_menu = next(self.search_dict(data, 'sortFilterSubMenuRenderer'), {}).get('subMenuItems', [])
-        if not sort_menu:
-            # No sort menu. Maybe this is a request for community posts?
-            section_list = next(self.search_dict(data, 'sectionListRenderer'), {})
-            continuations = list(self.search_dict(section_list, 'continuationEndpoint'))
-            # Retry..
-            data = self.ajax_request(continuations[0], ytcfg) if continuations else {}
-            sort_menu = next(self.search_dict(data, 'sortFilterSubMenuRenderer'), {}).get('subMenuItems', [])
+    def sort_menu(self, data):
+        return next(self.search_dict(data, 'sortFilterSubMenuRenderer'), {}).get('subMenuItems', [])
+
+    def sort_menu_continuation(self, data):
+        section_list = next(self.search_dict(data, 'sectionListRenderer'), {})
+        return next(self.search_dict(section_list, 'continuationEndpoint'), None)
+
+    def sort_endpoint(self, sort_menu, sort_by):
         if not sort_menu or sort_by >= len(sort_menu):
             raise RuntimeError('Failed to set sorting')
-        continuations = [sort_menu[sort_by]['serviceEndpoint']]
+        return sort_menu[sort_by]['serviceEndpoint']
 
-        while continuations:
-            continuation = continuations.pop()
-            response = self.ajax_request(continuation, ytcfg)
+    def parse_response(self, response, replies=True, parse_time=True, language=None):
+        # Returns the comments in a continuation response together with the continuations it contains:
+        # the next comments page, the reply threads of this page and the 'Show more replies' buttons.
+        if self.stats is None:
+            return self._parse_response(response, replies, parse_time, language)
+        start = time.perf_counter()
+        timings = {'time_parse': 0.0}
+        try:
+            return self._parse_response(response, replies, parse_time, language, timings)
+        finally:
+            self.stats.add_time('time_parse', timings['time_parse'])
+            self.stats.add_time('parse', time.perf_counter() - start - timings['time_parse'])
 
-            if not response:
-                break
+    def _parse_response(self, response, replies, parse_time, language, timings=None):
+        index = self.index_dict(response, RESPONSE_KEYS)
 
-            error = next(self.search_dict(response, 'externalErrorMessage'), None)
-            if error:
-                raise RuntimeError('Error returned from server: ' + error)
-
-            actions = list(self.search_dict(response, 'reloadContinuationItemsCommand')) + \
-                      list(self.search_dict(response, 'appendContinuationItemsAction'))
-            for action in actions:
-                for item in action.get('continuationItems', []):
-                    if action['targetId'] in ['comments-section',
-                                              'engagement-panel-comments-section',
-                                              'shorts-engagement-panel-comments-section']:
-                        # Process continuations for comments and replies.
-                        continuations[:0] = [ep for ep in self.search_dict(item, 'continuationEndpoint')]
-                    if action['targetId'].startswith('comment-replies-item') and 'continuationItemRenderer' in item:
-                        # Process the 'Show more replies' button
-                        continuations.append(next(self.search_dict(item, 'buttonRenderer'))['command'])
-
-            surface_payloads = self.search_dict(response, 'commentSurfaceEntityPayload')
-            payments = {payload['key']: next(self.search_dict(payload, 'simpleText'), '')
-                        for payload in surface_payloads if 'pdgCommentChip' in payload}
-            if payments:
-                # We need to map the payload keys to the comment IDs.
-                view_models = [vm['commentViewModel'] for vm in self.search_dict(response, 'commentViewModel')]
-                surface_keys = {vm['commentSurfaceKey']: vm['commentId']
-                                for vm in view_models if 'commentSurfaceKey' in vm}
-                payments = {surface_keys[key]: payment for key, payment in payments.items() if key in surface_keys}
-
-            toolbar_payloads = self.search_dict(response, 'engagementToolbarStateEntityPayload')
-            toolbar_states = {payload['key']: payload for payload in toolbar_payloads}
-            for comment in reversed(list(self.search_dict(response, 'commentEntityPayload'))):
-                properties = comment['properties']
-                cid = properties['commentId']
-                author = comment['author']
-                toolbar = comment['toolbar']
-                toolbar_state = toolbar_states[properties['toolbarStateKey']]
-                result = {'cid': cid,
-                          'text': properties['content']['content'],
-                          'time': properties['publishedTime'],
-                          'author': author['displayName'],
-                          'channel': author['channelId'],
-                          'votes': toolbar['likeCountNotliked'].strip() or "0",
-                          'replies': toolbar['replyCount'],
-                          'photo': author['avatarThumbnailUrl'],
-                          'heart': toolbar_state.get('heartState', '') == 'TOOLBAR_HEART_STATE_HEARTED',
-                          'reply': '.' in cid}
+        error = next(iter(index['externalErrorMessage']), None)
+        if error:
+            raise RuntimeError('Error returned from server: ' + error)
 
-                try:
-                    result['time_parsed'] = dateparser.parse(result['time'].split('(')[0].strip()).timestamp()
-                except AttributeError:
-                    pass
+        page_continuations = []
+        thread_continuations = []
+        reply_continuations = []
+        actions = index['reloadContinuationItemsCommand'] + index['appendContinuationItemsAction']
+        for action in actions:
+            for item in action.get('continuationItems', []):
+                if action['targetId'] in ['comments-section',
+                                          'engagement-panel-comments-section',
+                                          'shorts-engagement-panel-comments-section']:
+                    # Process continuations for comments and replies.
+                    if 'commentThreadRenderer' in item:
+                        if replies:
+                            thread_continuations.extend(self.search_dict(item, 'continuationEndpoint'))
+                    else:
+                        page_continuations.extend(self.search_dict(item, 'continuationEndpoint'))
+                if action['targetId'].startswith('comment-replies-item') and 'continuationItemRenderer' in item:
+                    # Process the 'Show more replies' button
+                    reply_continuations.append(next(self.search_dict(item, 'buttonRenderer'))['command'])
 
-                if cid in payments:
-                    result['paid'] = payments[cid]
+        surface_payloads = index['commentSurfaceEntityPayload']
+        payments = {payload['key']: next(self.search_dict(payload, 'simpleText'), '')
+                    for payload in surface_payloads if 'pdgCommentChip' in payload}
+        if payments:
+            # We need to map the payload keys to the comment IDs.
+            view_models = [vm['commentViewModel'] for vm in index['commentViewModel']]
+            surface_keys = {vm['commentSurfaceKey']: vm['commentId']
+                            for vm in view_models if 'commentSurfaceKey' in vm}
+            payments = {surface_keys[key]: payment for key, payment in payments.items() if key in surface_keys}
 
-                yield result
-            time.sleep(sleep)
+        toolbar_payloads = index['engagementToolbarStateEntityPayload']
+        toolbar_states = {payload['key']: payload for payload in toolbar_payloads}
+        now = time.time()
+        comments = []
+        for comment in reversed(index['commentEntityPayload']):
+            properties = comment['properties']
+            cid = properties['commentId']
+            author = comment['author']
+            toolbar = comment['toolbar']
+            toolbar_state = toolbar_states[properties['toolbarStateKey']]
+            result = {'cid': cid,
+                      'text': properties['content']['content'],
+                      'time': properties['publishedTime'],
+                      'author': author['displayName'],
+                      'channel': author['channelId'],
+                      'votes': toolbar['likeCountNotliked'].strip() or "0",
+                      'replies': toolbar['replyCount'],
+                      'photo': author['avatarThumbnailUrl'],
+                      'heart': toolbar_state.get('heartState', '') == 'TOOLBAR_HEART_STATE_HEARTED',
+                      'reply': '.' in cid}
+
+            if parse_time:
+                if timings is not None:
+                    start = time.perf_counter()
+                    time_parsed = parse_published_time(result['time'], language, now)
+                    timings['time_parse'] += time.perf_counter() - start
+                else:
+                    time_parsed = parse_published_time(result['time'], language, now)
+                if time_parsed is not None:
+                    result['time_parsed'] = time_parsed
+
+            if cid in payments:
+                result['paid'] = payments[cid]
+
+            comments.append(result)
+
+        return comments, page_continuations, thread_continuations, reply_continuations
 
     @staticmethod
     def regex_search(text, pattern, group=1, default=None):
@@ -165,3 +199,412 @@ class YoutubeCommentDownloader:
                         stack.append(value)
             elif isinstance(current_item, list):
                 stack.extend(current_item)
+
+    @staticmethod
+    def index_dict(partial, search_keys):
+        # Walks the tree once and returns {key: [values]} for all search_keys. Each list holds the same values,
+        # in the same order, as list(search_dict(partial, key)) would.
+        index = {key: [] for key in search_keys}
+        stack = [(partial, ())]
+        while stack:
+            current_item, found = stack.pop()
+            if isinstance(current_item, dict):
+                for key, value in current_item.items():
+                    if key in index and key not in found:
+                        index[key].append(value)
+                        # search_dict doesn't look for a key inside its own matches, but other keys may be in there
+                        if isinstance(value, (dict, list)):
+                            stack.append((value, found + (key,)))
+                    elif isinstance(value, (dict, list)):
+                        stack.append((value, found))
+            elif isinstance(current_item, list):
+                stack.extend([(item, found) for item in current_item])
+        return index
+
+
+class YoutubeCommentDownloader(CommentParser):
+
+    def __init__(self, rate_limit=None, cache=None, retry_policy=None, circuit_breaker=None, stats=None,
+                 base_url=YOUTUBE_URL, consent_url=YOUTUBE_CONSENT_URL):
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        self.session.cookies.set('CONSENT', 'YES+cb', domain='.youtube.com')
+        # Maximum number of requests per second sent to each host, shared by all downloaders in this process
+        self.rate_limiter = shared_rate_limiter(rate_limit) if rate_limit else None
+        # Optional ResponseCache for watch pages and continuation responses
+        self.cache = cache
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Defaults to a process-wide breaker per host
+        self.circuit_breaker = circuit_breaker
+        # (ytcfg, time it was fetched), see session_ytcfg
+        self._ytcfg = None
+        # Optional CrawlStats collecting counters and timings, can be shared between downloaders
+        self.stats = stats
+        # Where API calls (and watch pages of video IDs) and the cookie consent form go, e.g. a local stand-in
+        self.base_url = base_url.rstrip('/')
+        self.consent_url = consent_url
+
+    def ajax_request(self, endpoint, ytcfg, retries=None, sleep=None, timeout=60):
+        # retries defaults to the retry policy's; a fixed `sleep` replaces its backoff
+        url = self.base_url + endpoint['commandMetadata']['webCommandMetadata']['apiUrl']
+
+        data = {'context': ytcfg['INNERTUBE_CONTEXT'],
+                'continuation': endpoint['continuationCommand']['token']}
+
+        if self.cache is not None:
+            client = data['context'].get('client', {})
+            key = cache_key('POST', url, data['continuation'], client.get('hl'), client.get('gl'))
+            response = self.cache.get(key)
+            if response is None:
+                response = self._ajax_request(url, data, ytcfg, retries, sleep, timeout)
+                if response:
+                    self.cache.set(key, response)
+            elif self.stats is not None:
+                self.stats.count('cache_hits')
+        else:
+            response = self._ajax_request(url, data, ytcfg, retries, sleep, timeout)
+        if response and self.stats is not None:
+            self.stats.count('pages')
+        return response
+
+    def _ajax_request(self, url, data, ytcfg, retries, sleep, timeout):
+        retries = self.retry_policy.retries if retries is None else retries
+        breaker = self.circuit_breaker or circuit_breaker(urlparse(url).netloc)
+        stats = self.stats
+        error = None
+        for attempt in range(retries):
+            breaker.check()
+            retry_after = None
+            try:
+                if self.rate_limiter:
+                    start = time.perf_counter()
+                    self.rate_limiter.acquire(url)
+                    if stats is not None:
+                        stats.add_time('rate_limit', time.perf_counter() - start)
+                start = time.perf_counter()
+                try:
+                    response = self.session.post(url, params={'key': ytcfg['INNERTUBE_API_KEY']}, json=data,
+                                                 timeout=timeout)
+                    # The body is read (and decompressed) before the attempt is recorded
+                    response.content
+                except requests.exceptions.RequestException as e:
+                    error = type(e).__name__
+                    if stats is not None:
+                        stats.request(urlparse(url).path, time.perf_counter() - start, error=error)
+                else:
+                    if stats is not None:
+                        stats.request(urlparse(url).path, time.perf_counter() - start, status=response.status_code,
+                                      size=received_size(response))
+                    if response.status_code == 200:
+                        try:
+                            result = response.json()
+                        except ValueError:
+                            error = 'Invalid JSON response'
+                        else:
+                            breaker.record_success()
+                            return result
+                    elif response.status_code in [403, 413]:
+                        breaker.record_success()
+                        return {}
+                    else:
+                        if response.status_code in [429, 503]:
+                            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                        error = 'HTTP %d' % response.status_code
+            except BaseException:
+                # Neither a success nor a failure of the host, but a trial request has to be given back
+                breaker.release()
+                raise
+            breaker.record_failure()
+            if attempt + 1 < retries:
+                delay = sleep if sleep is not None else self.retry_policy.delay(attempt, retry_after)
+                if stats is not None:
+                    stats.count('retries')
+                    stats.add_time('retry_sleep', delay)
+                time.sleep(delay)
+        raise RuntimeError('Request to %s failed after %d attempts (%s)' % (url, retries, error))
+
+    def watch_page_data(self, youtube_url, ytcfg=True):
+        # (ytcfg, ytInitialData) of a watch page, read from a stream that's closed as soon as they're found
+        if self.cache is not None:
+            key = cache_key('GET', youtube_url, 'bootstrap')
+            cached = self.cache.get(key)
+            if cached is None:
+                # Cached entries always include ytcfg, whoever reads them next may need it
+                cached = dict(zip(('ytcfg', 'data'), self._scan_watch_page(youtube_url, True)))
+                # A page without ytcfg (consent wall, bot check) isn't the video's, the next request may get it
+                if cached['ytcfg']:
+                    self.cache.set(key, cached)
+            elif self.stats is not None:
+                self.stats.count('cache_hits')
+            return cached['ytcfg'], cached['data']
+        return self._scan_watch_page(youtube_url, ytcfg)
+
+    def _scan_watch_page(self, youtube_url, ytcfg):
+        start = time.perf_counter()
+        response = self._open_watch_page(youtube_url)
+
+        def chunks():
+            decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+            for chunk in response.iter_content(WATCH_PAGE_CHUNK_SIZE):
+                yield decoder.decode(chunk)
+
+        try:
+            if response.status_code != 200:
+                # Error pages (429, bot checks) have no comments to find
+                raise RuntimeError('Request to %s failed with HTTP %d' % (youtube_url, response.status_code))
+            return scan_watch_page(chunks(), ytcfg)
+        finally:
+            if self.stats is not None:
+                self.stats.count('watch_pages')
+                self.stats.request(urlparse(youtube_url).path, time.perf_counter() - start,
+                                   status=response.status_code, size=received_size(response))
+            # Drops the rest of the page (and with it the connection)
+            response.close()
+
+    def _open_watch_page(self, youtube_url):
+        response = self.session.get(youtube_url, stream=True)
+
+        if response.status_code == 200 and 'consent' in str(response.url):
+            # We may get redirected to a separate page for cookie consent. If this happens we agree automatically.
+            params = self.consent_params(response.text, youtube_url)
+            response = self.session.post(self.consent_url, params=params, stream=True)
+        return response
+
+    def session_ytcfg(self):
+        # The ytcfg of an earlier watch page: the API key and client context are the same for every video, so
+        # they're only parsed once per session. A copy is returned as the language is set on it per crawl.
+        if self._ytcfg is None or time.time() - self._ytcfg[1] > YTCFG_TTL:
+            return None
+        return copy.deepcopy(self._ytcfg[0])
+
+    def get_comments(self, youtube_id, *args, **kwargs):
+        return self.get_comments_from_url(self.base_url + WATCH_PATH.format(youtube_id=youtube_id), *args, **kwargs)
+
+    def get_comments_from_url(self, youtube_url, sort_by=SORT_BY_RECENT, language=None, sleep=.1,
+                              limit=None, max_pages=None, deadline=None, replies=True, workers=None,
+                              parse_time=True, since=None, checkpoint=None, compact=False):
+        # limit: stop after yielding this many comments
+        # max_pages: stop after this many continuation requests
+        # deadline: stop paging once time.time() passes this timestamp
+        # replies: whether to follow reply-thread continuations
+        # workers: fetch the next page and reply threads concurrently with this many threads
+        # parse_time: whether to add a 'time_parsed' timestamp to each comment
+        # since: HighWaterMark from a previous run, only comments newer than it are yielded (requires SORT_BY_RECENT)
+        # checkpoint: Checkpoint to save the crawl state to, and to resume from if it belongs to this crawl
+        # compact: yield read-only records.Comment objects instead of dicts, with time_parsed parsed on access
+        if since is not None and sort_by != SORT_BY_RECENT:
+            raise ValueError('Only comments sorted by recent can be downloaded incrementally')
+        if limit is not None and limit <= 0:
+            return
+
+        if checkpoint is not None and workers and workers > 1:
+            raise ValueError('Checkpoints are only supported by the serial crawl')
+
+        if checkpoint is not None and checkpoint.resumable(youtube_url, sort_by):
+            ytcfg = checkpoint.state['ytcfg']
+            continuations = checkpoint.state['continuations']
+        else:
+            ytcfg, continuation = self._bootstrap(youtube_url, sort_by, language)
+            if not ytcfg:
+                return
+            continuations = [continuation]
+            if checkpoint is not None:
+                checkpoint.start(youtube_url, sort_by, ytcfg)
+
+        eager_time = parse_time and not compact
+        if workers and workers > 1:
+            comments = self._crawl_concurrent(continuations[0], ytcfg, workers, max_pages, deadline, replies,
+                                              eager_time)
+        else:
+            comments = self._crawl(continuations, ytcfg, sleep, max_pages, deadline, replies, eager_time, checkpoint)
+
+        if compact:
+            comments = compact_comments(comments, parse_time, ytcfg['INNERTUBE_CONTEXT']['client'].get('hl'))
+
+        if since is not None:
+            comments = self._new_comments(comments, since)
+
+        count = checkpoint.emitted if checkpoint is not None else 0
+        try:
+            if limit is not None and count >= limit:
+                return
+            for comment in comments:
+                yield comment
+                count += 1
+                if self.stats is not None:
+                    self.stats.count('comments')
+                if checkpoint is not None:
+                    checkpoint.comment_emitted()
+                if limit is not None and count >= limit:
+                    return
+        finally:
+            comments.close()
+
+    def _bootstrap(self, youtube_url, sort_by, language):
+        # Returns the ytcfg and the continuation for the first page of comments, or (None, None) if there are
+        # none. Raises if the watch page can't be read.
+        if self.stats is None:
+            return self._fetch_bootstrap(youtube_url, sort_by, language)
+        with self.stats.timer('bootstrap'):
+            return self._fetch_bootstrap(youtube_url, sort_by, language)
+
+    def _fetch_bootstrap(self, youtube_url, sort_by, language):
+        ytcfg = self.session_ytcfg()
+        page_ytcfg, data = self.watch_page_data(youtube_url, ytcfg=ytcfg is None)
+        # Without them the page wasn't the video's (consent wall, bot check), which isn't the same as a video
+        # without comments: callers get an error, rather than no comments, and can try again later
+        if ytcfg is None and not page_ytcfg:
+            raise RuntimeError('Unable to extract the configuration from %s' % youtube_url)
+        if not data:
+            raise RuntimeError('Unable to extract ytInitialData from %s' % youtube_url)
+        if ytcfg is None:
+            self._ytcfg = (page_ytcfg, time.time())
+            ytcfg = copy.deepcopy(page_ytcfg)
+        if language:
+            ytcfg['INNERTUBE_CONTEXT']['client']['hl'] = language
+        if not self.has_comments(data):
+            # Comments disabled?
+            return None, None
+
+        sort_menu = self.sort_menu(data)
+        if not sort_menu:
+            # No sort menu. Maybe this is a request for community posts?
+            continuation = self.sort_menu_continuation(data)
+            # Retry..
+            data = self.ajax_request(continuation, ytcfg) if continuation else {}
+            sort_menu = self.sort_menu(data)
+        return ytcfg, self.sort_endpoint(sort_menu, sort_by)
+
+    @staticmethod
+    def _new_comments(comments, since):
+        # The first top-level comment may be pinned, so it's skipped rather than taken as the point where the
+        # comments we've already seen start. Replies are dropped along with the comment they belong to.
+        top_level = 0
+        skipped = set()
+        try:
+            for comment in comments:
+                if comment['reply']:
+                    if comment['cid'].split('.')[0] not in skipped:
+                        yield comment
+                    continue
+                top_level += 1
+                if since.is_old(comment):
+                    if top_level > 1:
+                        return
+                    skipped.add(comment['cid'])
+                    continue
+                yield comment
+        finally:
+            comments.close()
+
+    def _crawl(self, continuations, ytcfg, sleep, max_pages, deadline, replies, parse_time, checkpoint=None):
+        language = ytcfg['INNERTUBE_CONTEXT']['client'].get('hl')
+        pages = 0
+        while continuations:
+            if checkpoint is not None:
+                # All comments of the previous page have been consumed at this point
+                checkpoint.update(continuations)
+            if max_pages is not None and pages >= max_pages:
+                break
+            if deadline is not None and time.time() >= deadline:
+                break
+            pages += 1
+
+            continuation = continuations.pop()
+            response = self.ajax_request(continuation, ytcfg)
+
+            if not response:
+                break
+
+            comments, page_continuations, thread_continuations, reply_continuations = \
+                self.parse_response(response, replies, parse_time, language)
+            # Replies are fetched thread by thread before moving on to the next page.
+            continuations[:0] = page_continuations[::-1] + thread_continuations[::-1]
+            continuations.extend(reply_continuations)
+
+            for comment in comments:
+                yield comment
+            if self.stats is not None:
+                self.stats.add_time('sleep', sleep)
+            time.sleep(sleep)
+
+        if checkpoint is not None:
+            checkpoint.update(continuations, force=True)
+
+    def _crawl_concurrent(self, first_continuation, ytcfg, workers, max_pages, deadline, replies, parse_time):
+        # Top-level pages are chained through their continuation token and are fetched one after the other,
+        # while reply threads are fetched by the pool in parallel. Comments are yielded in the same order as
+        # the serial crawl: a page, the replies of each of its threads, then the next page.
+        adapter = self.session.get_adapter('https://')
+        if getattr(adapter, '_pool_maxsize', workers) < workers:
+            self.session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=workers))
+
+        language = ytcfg['INNERTUBE_CONTEXT']['client'].get('hl')
+        budget = {'pages': 0, 'ahead': 1}
+        budget_lock = threading.Lock()
+        stopped = threading.Event()
+
+        def fetch(continuation):
+            if stopped.is_set():
+                return None
+            with budget_lock:
+                if max_pages is not None and budget['pages'] >= max_pages:
+                    return None
+                if deadline is not None and time.time() >= deadline:
+                    return None
+                budget['pages'] += 1
+            return self.ajax_request(continuation, ytcfg)
+
+        def fetch_thread(continuation):
+            # Reply pages within a thread depend on each other, so a thread is walked by a single worker.
+            thread_comments = []
+            stack = [continuation]
+            while stack:
+                response = fetch(stack.pop())
+                if not response:
+                    break
+                comments, _, _, reply_continuations = self.parse_response(response, replies, parse_time, language)
+                thread_comments.extend(comments)
+                stack.extend(reply_continuations[::-1])
+            return thread_comments
+
+        def fetch_page(continuation):
+            # Reply threads are queued as soon as their page arrives, and the next page is prefetched as long as
+            # we're less than `workers` pages ahead of the consumer.
+            response = fetch(continuation)
+            if not response:
+                return None
+            comments, page_continuations, thread_continuations, _ = \
+                self.parse_response(response, replies, parse_time, language)
+            threads = [pool.submit(fetch_thread, continuation) for continuation in thread_continuations]
+            next_page = page_continuations[0] if page_continuations else None
+            with budget_lock:
+                if next_page is not None and budget['ahead'] < workers:
+                    budget['ahead'] += 1
+                    next_page = pool.submit(fetch_page, next_page)
+            return comments, threads, next_page
+
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            page = pool.submit(fetch_page, first_continuation)
+            while page is not None:
+                result = page.result()
+                with budget_lock:
+                    budget['ahead'] -= 1
+                if result is None:
+                    break
+
+                comments, threads, page = result
+                if page is not None and not isinstance(page, Future):
+                    with budget_lock:
+                        budget['ahead'] += 1
+                    page = pool.submit(fetch_page, page)
+
+                for comment in comments:
+                    yield comment
+                for thread in threads:
+                    for comment in thread.result():
+                        yield comment
+        finally:
+            stopped.set()
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,74 @@
+import json
+import os
+import time
+
+# Number of newest top-level comment IDs remembered per video
+KEEP_CIDS = 20
+
+
+class HighWaterMark(object):
+    # The newest top-level comments of a video seen by a previous run. A recent-sorted crawl can stop as soon as
+    # it reaches one of them, or a comment that's certainly older.
+
+    def __init__(self, cids=(), time_parsed=None, updated=None):
+        self.cids = list(cids)
+        self.time_parsed = time_parsed
+        self.updated = updated
+        self._cids = set(self.cids)
+
+    def is_old(self, comment):
+        if comment['cid'] in self._cids:
+            return True
+        if self.time_parsed is None or 'time_parsed' not in comment:
+            return False
+        # Relative times are rounded down ("3 weeks ago" covers 3 to 4 weeks), so a parsed time is never earlier
+        # than the real one, but may be later by up to the age of the comment when it was parsed.
+        slack = max(self.updated - self.time_parsed, 86400) if self.updated else 86400
+        return comment['time_parsed'] < self.time_parsed - slack
+
+    def advance(self, comments):
+        # Returns the mark after a run that emitted `comments` (top-level ones, newest first)
+        cids = [comment['cid'] for comment in comments[:KEEP_CIDS]]
+        cids += [cid for cid in self.cids if cid not in set(cids)][:KEEP_CIDS - len(cids)]
+        times = [comment['time_parsed'] for comment in comments if 'time_parsed' in comment]
+        if self.time_parsed is not None:
+            times.append(self.time_parsed)
+        return HighWaterMark(cids, max(times) if times else None, time.time())
+
+    def to_dict(self):
+        return {'cids': self.cids, 'time_parsed': self.time_parsed, 'updated': self.updated}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('cids', ()), data.get('time_parsed'), data.get('updated'))
+
+
+def track_newest(comments, newest):
+    # Passes comments through while collecting the first KEEP_CIDS top-level ones into `newest`
+    for comment in comments:
+        if not comment['reply'] and len(newest) < KEEP_CIDS:
+            newest.append(comment)
+        yield comment
+
+
+class SinceState(object):
+    # JSON file with a HighWaterMark per video
+
+    def __init__(self, path):
+        self.path = path
+        self.marks = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf8') as fp:
+                self.marks = {video: HighWaterMark.from_dict(mark) for video, mark in json.load(fp).items()}
+
+    def get(self, video):
+        return self.marks.get(video)
+
+    def set(self, video, mark):
+        self.marks[video] = mark
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf8') as fp:
+            json.dump({video: mark.to_dict() for video, mark in self.marks.items()}, fp, indent=2)
+        os.replace(tmp_path, self.path)
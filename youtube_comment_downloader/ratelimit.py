@@ -0,0 +1,90 @@
+import threading
+import time
+
+from urllib.parse import urlparse
+
+
+class RateLimiter(object):
+    """Thread-safe token bucket allowing `rate` acquisitions per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def reserve(self):
+        # Takes a token and returns how long the caller has to wait before using it.
+        with self._lock:
+            self._refill()
+            # Going negative reserves a future token, so concurrent callers queue up behind each other.
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0
+
+    def limit(self, rate, burst=1):
+        # Lowers the rate and burst to these, where they're lower than the current ones
+        with self._lock:
+            self._refill()
+            self.rate = min(self.rate, float(rate))
+            self.burst = min(self.burst, max(1, burst))
+            self._tokens = min(self._tokens, self.burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class HostRateLimiter(object):
+    """Keeps one RateLimiter per host so that requests to different hosts don't throttle each other.
+
+    With shared=True the limiters come from a process-wide registry keyed by host alone, so every shared
+    HostRateLimiter draws from the same bucket for a host whatever rate it was created with. When their rates
+    differ the lowest one wins: a host's bucket is slowed down to the rate and burst of the strictest limiter
+    that has used it, and stays that way for the life of the process.
+    """
+
+    def __init__(self, rate, burst=1, shared=False):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = rate
+        self.burst = burst
+        self.shared = shared
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, host):
+        limiters, lock = (_shared_limiters, _shared_limiters_lock) if self.shared else (self._limiters, self._lock)
+        with lock:
+            limiter = limiters.get(host)
+            if limiter is None:
+                limiter = limiters[host] = RateLimiter(self.rate, self.burst)
+            elif limiter.rate > self.rate or limiter.burst > max(1, self.burst):
+                limiter.limit(self.rate, self.burst)
+            return limiter
+
+    def acquire(self, url):
+        return self.limiter(urlparse(url).netloc).acquire()
+
+    def reserve(self, url):
+        return self.limiter(urlparse(url).netloc).reserve()
+
+
+# RateLimiters per host shared by all the HostRateLimiters created with shared=True
+_shared_limiters = {}
+_shared_limiters_lock = threading.Lock()
+
+
+def shared_rate_limiter(rate, burst=1):
+    # HostRateLimiter drawing from the process-wide buckets, so all downloaders crawling a host are throttled
+    # together. The lowest rate asked for a host wins.
+    return HostRateLimiter(rate, burst, shared=True)
@@ -0,0 +1,136 @@
+import math
+import sys
+import time
+from array import array
+from collections.abc import Mapping
+
+from .timeparse import parse_time
+
+# The keys every comment has, in the order of the comment dicts. 'time_parsed' and 'paid' are optional.
+FIELDS = ('cid', 'text', 'time', 'author', 'channel', 'votes', 'replies', 'photo', 'heart', 'reply')
+# Short strings that repeat across a video's comments, stored once
+INTERNED = ('time', 'author', 'channel', 'votes', 'replies', 'photo')
+
+_UNPARSED = object()
+
+
+class Comment(Mapping):
+    # Read-only comment with the same keys as the comment dicts, without a per-comment dict. time_parsed is
+    # only computed when it's first accessed, relative to the time the comment was fetched.
+    __slots__ = FIELDS + ('paid', '_time_parsed', '_language', '_fetched')
+
+    def __init__(self, cid, text, time, author, channel, votes, replies, photo, heart, reply, paid=None,
+                 time_parsed=_UNPARSED, language=None, fetched=None):
+        self.cid = cid
+        self.text = text
+        self.time = sys.intern(time)
+        self.author = sys.intern(author)
+        self.channel = sys.intern(channel)
+        self.votes = sys.intern(votes)
+        self.replies = sys.intern(replies)
+        self.photo = sys.intern(photo)
+        self.heart = heart
+        self.reply = reply
+        self.paid = paid
+        self._time_parsed = time_parsed
+        self._language = language
+        self._fetched = fetched
+
+    @classmethod
+    def from_dict(cls, comment, parse_time=True, language=None, fetched=None):
+        # With parse_time, a 'time_parsed' already in the dict is kept, otherwise it's parsed lazily
+        time_parsed = comment.get('time_parsed', _UNPARSED) if parse_time else None
+        return cls(*[comment[name] for name in FIELDS], paid=comment.get('paid'), time_parsed=time_parsed,
+                   language=language, fetched=fetched)
+
+    @property
+    def time_parsed(self):
+        if self._time_parsed is _UNPARSED:
+            self._time_parsed = parse_time(self.time, self._language, self._fetched)
+        return self._time_parsed
+
+    def __getitem__(self, key):
+        if key in FIELDS:
+            return getattr(self, key)
+        value = self.time_parsed if key == 'time_parsed' else self.paid if key == 'paid' else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        for name in FIELDS:
+            yield name
+        if self.time_parsed is not None:
+            yield 'time_parsed'
+        if self.paid is not None:
+            yield 'paid'
+
+    def __len__(self):
+        return len(FIELDS) + (self.time_parsed is not None) + (self.paid is not None)
+
+    def to_dict(self):
+        return dict(self)
+
+    def __repr__(self):
+        return 'Comment(%r)' % self.to_dict()
+
+
+def compact_comments(comments, parse_time=True, language=None):
+    # Turns a stream of comment dicts into Comments. The fetch time is taken as the comments come in, which is
+    # right after their page was downloaded.
+    try:
+        for comment in comments:
+            yield Comment.from_dict(comment, parse_time, language, time.time())
+    finally:
+        comments.close()
+
+
+class CommentBatch(object):
+    # Column-wise accumulator for callers that keep every comment of a crawl: one list (or array) per key
+    # instead of one object per comment. Indexing and iteration give back comment dicts.
+
+    def __init__(self, comments=()):
+        self.columns = {name: [] for name in FIELDS if name not in ('heart', 'reply')}
+        self.columns['heart'] = array('b')
+        self.columns['reply'] = array('b')
+        # NaN where a comment has no parsed time
+        self.columns['time_parsed'] = array('d')
+        # Sparse, only few comments are paid
+        self.paid = {}
+        self.extend(comments)
+
+    def append(self, comment):
+        columns = self.columns
+        for name in FIELDS:
+            value = comment[name]
+            columns[name].append(sys.intern(value) if name in INTERNED else value)
+        columns['time_parsed'].append(comment.get('time_parsed', math.nan))
+        if 'paid' in comment:
+            self.paid[len(self) - 1] = comment['paid']
+
+    def extend(self, comments):
+        for comment in comments:
+            self.append(comment)
+
+    def column(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self.columns['cid'])
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        comment = {name: self.columns[name][index] for name in FIELDS}
+        comment['heart'] = bool(comment['heart'])
+        comment['reply'] = bool(comment['reply'])
+        time_parsed = self.columns['time_parsed'][index]
+        if not math.isnan(time_parsed):
+            comment['time_parsed'] = time_parsed
+        if index in self.paid:
+            comment['paid'] = self.paid[index]
+        return comment
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
@@ -0,0 +1,105 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class RetryPolicy(object):
+    """Exponential backoff with full jitter.
+
+    The n-th retry waits a random time between 0 and min(cap, base * 2 ** n) seconds. A Retry-After header
+    (seconds or an HTTP date) overrides the backoff, up to `max_retry_after` seconds.
+    """
+
+    def __init__(self, retries=5, base=1.0, cap=60.0, jitter=True, max_retry_after=600.0):
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+        self.jitter = jitter
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(max(retry_after, 0), self.max_retry_after)
+        delay = min(self.cap, self.base * 2 ** attempt)
+        return random.uniform(0, delay) if self.jitter else delay
+
+
+def parse_retry_after(value):
+    # Returns the number of seconds a Retry-After header asks us to wait, or None
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker(object):
+    """Fails fast once a host keeps failing.
+
+    After `threshold` consecutive failed attempts the circuit opens and check() raises CircuitOpenError for
+    `reset_timeout` seconds. Then a single trial request is let through: if it succeeds the circuit closes
+    again, otherwise it stays open for another `reset_timeout`. A trial that ends without an answer either way
+    (the caller was cancelled, or gave up on an unexpected error) has to be released, so that the next check()
+    can start another one.
+    """
+
+    def __init__(self, threshold=20, reset_timeout=60.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def check(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0 or self._trial:
+                raise CircuitOpenError('Too many failed requests, not retrying for %.0f seconds' % max(remaining, 0))
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def release(self):
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def circuit_breaker(host, threshold=20, reset_timeout=60.0):
+    # Process-wide breaker for a host, shared by all downloaders
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(host)
+        if breaker is None:
+            breaker = _circuit_breakers[host] = CircuitBreaker(threshold, reset_timeout)
+        return breaker
@@ -0,0 +1,206 @@
+import bisect
+import json
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the request latency buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRICS_PREFIX = 'youtube_comment_downloader'
+# Observed values a Histogram keeps to compute its quantiles from
+SAMPLE_SIZE = 10000
+
+
+class Histogram(object):
+    """Counts of observed values per bucket, like a Prometheus histogram.
+
+    Quantiles are computed from the observed values themselves rather than the buckets, so they move with the
+    latency instead of snapping to bucket bounds. Up to sample_size values are kept: all of them for shorter
+    crawls, a uniform random sample of them (reservoir sampling) for longer ones.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, sample_size=SAMPLE_SIZE):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.sample_size = sample_size
+        self.samples = []
+        self._random = random.Random(0)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        if len(self.samples) < self.sample_size:
+            self.samples.append(value)
+        else:
+            index = self._random.randrange(self.count)
+            if index < self.sample_size:
+                self.samples[index] = value
+
+    def quantile(self, q):
+        if not self.samples:
+            return None
+        # Nearest rank
+        samples = sorted(self.samples)
+        return samples[max(0, math.ceil(q * len(samples)) - 1)]
+
+    def to_dict(self):
+        return {'count': self.count,
+                'mean': self.sum / self.count if self.count else None,
+                'p50': self.quantile(0.5),
+                'p90': self.quantile(0.9),
+                'p99': self.quantile(0.99),
+                'max': self.max,
+                'buckets': dict(zip([str(bound) for bound in self.buckets] + ['+Inf'], self.counts))}
+
+
+class CrawlStats(object):
+    """Counters and timings of the crawls of one or more downloaders.
+
+    Counters: pages (API responses, cached ones included), requests (HTTP attempts), bytes (body bytes as
+    received, before decompression), retries, cache_hits, comments and watch_pages, plus the HTTP status codes and
+    network errors seen. Stage timers add up the seconds spent in request, parse (index_dict and building the
+    comments), time_parse (timeparse.parse_time, which only falls back to dateparser for times its fast path
+    doesn't know), rate_limit, retry_sleep and sleep, and in bootstrap (watch page to first continuation, which
+    includes its requests). With concurrent workers stages overlap, so they can add up to more than the elapsed
+    time. Request latency is kept as a histogram per endpoint. All methods can be called from several threads.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters = defaultdict(int)
+        self.statuses = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.stages = defaultdict(float)
+        self.latency = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def add_time(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] += seconds
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def request(self, endpoint, seconds, status=None, size=0, error=None):
+        # Records one HTTP attempt: its latency and either the status code and body size, or the error
+        with self._lock:
+            self.counters['requests'] += 1
+            self.counters['bytes'] += size
+            self.stages['request'] += seconds
+            if endpoint not in self.latency:
+                self.latency[endpoint] = Histogram()
+            self.latency[endpoint].observe(seconds)
+            if status is not None:
+                self.statuses[status] += 1
+            if error is not None:
+                self.errors[error] += 1
+
+    def elapsed(self):
+        return time.time() - self.started
+
+    def comments_per_second(self):
+        elapsed = self.elapsed()
+        return self.counters.get('comments', 0) / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self):
+        with self._lock:
+            return {'elapsed': self.elapsed(),
+                    'comments_per_second': self.comments_per_second(),
+                    'counters': dict(self.counters),
+                    'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+                    'errors': dict(self.errors),
+                    'stages': dict(self.stages),
+                    'latency': {endpoint: histogram.to_dict() for endpoint, histogram in self.latency.items()}}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix=METRICS_PREFIX):
+        # Prometheus text exposition format (version 0.0.4)
+        lines = []
+
+        def metric(name, kind, samples):
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+            for labels, value in samples:
+                label_text = ','.join('%s="%s"' % (key, _escape(val)) for key, val in labels)
+                lines.append('%s_%s%s %s' % (prefix, name, '{%s}' % label_text if labels else '', _number(value)))
+
+        with self._lock:
+            for name in ('pages', 'requests', 'bytes', 'retries', 'cache_hits', 'comments', 'watch_pages'):
+                metric(name + '_total', 'counter', [((), self.counters.get(name, 0))])
+            metric('responses_total', 'counter',
+                   [((('status', str(status)),), count) for status, count in sorted(self.statuses.items())])
+            metric('request_errors_total', 'counter',
+                   [((('error', error),), count) for error, count in sorted(self.errors.items())])
+            metric('stage_seconds_total', 'counter',
+                   [((('stage', stage),), seconds) for stage, seconds in sorted(self.stages.items())])
+            metric('comments_per_second', 'gauge', [((), self.comments_per_second())])
+
+            lines.append('# TYPE %s_request_duration_seconds histogram' % prefix)
+            for endpoint, histogram in sorted(self.latency.items()):
+                cumulative = 0
+                for bound, count in zip([_number(bound) for bound in histogram.buckets] + ['+Inf'],
+                                        histogram.counts):
+                    cumulative += count
+                    lines.append('%s_request_duration_seconds_bucket{endpoint="%s",le="%s"} %d'
+                                 % (prefix, _escape(endpoint), bound, cumulative))
+                lines.append('%s_request_duration_seconds_sum{endpoint="%s"} %s'
+                             % (prefix, _escape(endpoint), _number(histogram.sum)))
+                lines.append('%s_request_duration_seconds_count{endpoint="%s"} %d'
+                             % (prefix, _escape(endpoint), histogram.count))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def serve_metrics(stats, port, host='127.0.0.1'):
+    # Serves stats.to_prometheus() at /metrics and stats.to_json() at /stats from a daemon thread. Returns the
+    # server, whose shutdown() stops it.
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split('?')[0]
+            if path == '/metrics':
+                body, content_type = stats.to_prometheus(), 'text/plain; version=0.0.4; charset=utf-8'
+            elif path == '/stats':
+                body, content_type = stats.to_json(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            body = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
@@ -0,0 +1,59 @@
+import calendar
+import datetime
+import re
+import time
+from functools import lru_cache
+
+# Results are memoized per reference-time bucket, so a cached timestamp is at most this many seconds stale
+BUCKET_SECONDS = 60
+
+# YouTube's English relative times, e.g. "3 weeks ago" or "1 year ago (edited)"
+RELATIVE_TIME_RE = re.compile(r'^(\d+|an?)\s+(second|minute|hour|day|week|month|year)s?\s+ago$', re.IGNORECASE)
+
+UNIT_SECONDS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400, 'week': 604800}
+
+
+def parse_time(text, language=None, now=None):
+    # Returns the timestamp for a published time as shown by YouTube, or None if it can't be parsed
+    text = text.split('(')[0].strip()
+    now = time.time() if now is None else now
+    return _parse_time(text, language, int(now // BUCKET_SECONDS))
+
+
+@lru_cache(maxsize=4096)
+def _parse_time(text, language, bucket):
+    reference = datetime.datetime.fromtimestamp(bucket * BUCKET_SECONDS)
+
+    match = RELATIVE_TIME_RE.match(text)
+    if match:
+        amount, unit = match.groups()
+        amount = 1 if amount.lower() in ('a', 'an') else int(amount)
+        unit = unit.lower()
+        if unit == 'month':
+            return _months_ago(reference, amount).timestamp()
+        if unit == 'year':
+            return _months_ago(reference, 12 * amount).timestamp()
+        return (reference - datetime.timedelta(seconds=amount * UNIT_SECONDS[unit])).timestamp()
+
+    # Anything else (other languages, absolute dates) goes to dateparser, which is slow to import
+    import dateparser
+
+    settings = {'RELATIVE_BASE': reference}
+    parsed = None
+    if language:
+        try:
+            # Skips dateparser's language detection
+            parsed = dateparser.parse(text, languages=[language.split('-')[0]], settings=settings)
+        except ValueError:
+            pass  # Language not supported by dateparser
+    if parsed is None:
+        parsed = dateparser.parse(text, settings=settings)
+    return parsed.timestamp() if parsed else None
+
+
+def _months_ago(dt, months):
+    # Calendar arithmetic, matching dateparser: "1 month ago" on March 31st is February 28th/29th
+    month = dt.month - 1 - months
+    year = dt.year + month // 12
+    month = month % 12 + 1
+    return dt.replace(year=year, month=month, day=min(dt.day, calendar.monthrange(year, month)[1]))
@@ -0,0 +1,178 @@
+import gzip
+import io
+import json
+import sys
+import time
+
+INDENT = 4
+BUFFER_SIZE = 1 << 20
+# Number of records joined into a single write
+WRITE_BATCH = 1000
+
+FORMATS = ('json', 'parquet', 'arrow')
+COMPRESSIONS = ('gzip', 'zstd')
+# Arrow IPC streams compress their buffers with lz4 or zstd, gzip isn't supported
+ARROW_COMPRESSIONS = ('zstd',)
+
+# Columns of the Parquet/Arrow output, in the order of the comment dicts
+COLUMNS = [('cid', 'string'), ('text', 'string'), ('time', 'string'), ('author', 'string'),
+           ('channel', 'string'), ('votes', 'string'), ('replies', 'string'), ('photo', 'string'),
+           ('heart', 'bool'), ('reply', 'bool'), ('time_parsed', 'float64'), ('paid', 'string')]
+
+
+def to_json(comment, indent=None):
+    if not isinstance(comment, dict):
+        comment = dict(comment)  # records.Comment
+    comment_str = json.dumps(comment, ensure_ascii=False, indent=indent)
+    if indent is None:
+        return comment_str
+    padding = ' ' * (2 * indent) if indent else ''
+    return padding + comment_str.replace('\n', '\n' + padding)
+
+
+def guess_compression(path):
+    if path.endswith('.gz'):
+        return 'gzip'
+    if path.endswith('.zst'):
+        return 'zstd'
+    return None
+
+
+def open_text(path, append=False, compression=None):
+    # Opens a large-buffered text file, compressed as a stream if requested. Appending to a compressed file adds
+    # a new gzip member/zstd frame, which readers handle transparently.
+    mode = 'a' if append else 'w'
+    if compression == 'gzip':
+        return io.TextIOWrapper(io.BufferedWriter(gzip.open(path, mode + 'b', compresslevel=6), BUFFER_SIZE),
+                                encoding='utf8')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError('zstd compression requires the zstandard package')
+        raw = open(path, mode + 'b')
+        stream = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(io.BufferedWriter(stream, BUFFER_SIZE), encoding='utf8')
+    if compression:
+        raise ValueError('Unknown compression: %s' % compression)
+    return io.open(path, mode, encoding='utf8', buffering=BUFFER_SIZE)
+
+
+class JsonWriter(object):
+    # Line delimited JSON, or a single indented {"comments": [...]} document when pretty
+
+    def __init__(self, fp, pretty=False):
+        self.fp = fp
+        self.pretty = pretty
+        self.count = 0
+        self._pending = []
+        if pretty:
+            self.fp.write('{\n' + ' ' * INDENT + '"comments": [\n')
+
+    def write(self, comment):
+        if self.pretty:
+            self._pending.append((',\n' if self.count else '') + to_json(comment, indent=INDENT))
+        else:
+            self._pending.append(to_json(comment) + '\n')
+        self.count += 1
+        if len(self._pending) >= WRITE_BATCH:
+            self._write_pending()
+
+    def flush(self):
+        self._write_pending()
+        self.fp.flush()
+
+    def close(self):
+        self._write_pending()
+        if self.pretty:
+            self.fp.write(('\n' if self.count else '') + ' ' * INDENT + ']\n}')
+        self.fp.close()
+
+    def _write_pending(self):
+        if self._pending:
+            self.fp.write(''.join(self._pending))
+            self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ArrowWriter(object):
+    # Columnar output written in record batches, as a Parquet file or an Arrow IPC stream
+
+    def __init__(self, path, format='parquet', batch_size=10000, compression=None):
+        try:
+            import pyarrow
+        except ImportError:
+            raise RuntimeError('%s output requires the pyarrow package' % format)
+        self.pa = pyarrow
+        types = {'string': pyarrow.string(), 'bool': pyarrow.bool_(), 'float64': pyarrow.float64()}
+        self.schema = pyarrow.schema([(name, types[type_]) for name, type_ in COLUMNS])
+        self.batch_size = batch_size
+        self.count = 0
+        self._columns = {name: [] for name, _ in COLUMNS}
+        if format == 'parquet':
+            import pyarrow.parquet
+            self._writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression=compression or 'zstd')
+        else:
+            options = pyarrow.ipc.IpcWriteOptions(compression=compression) if compression else None
+            self._writer = pyarrow.ipc.new_stream(path, self.schema, options=options)
+
+    def write(self, comment):
+        for name, values in self._columns.items():
+            values.append(comment.get(name))
+        self.count += 1
+        if len(self._columns['cid']) >= self.batch_size:
+            self._write_batch()
+
+    def flush(self):
+        self._write_batch()
+
+    def close(self):
+        self._write_batch()
+        self._writer.close()
+
+    def _write_batch(self):
+        if not self._columns['cid']:
+            return
+        arrays = [self.pa.array(self._columns[name], type=field.type) for name, field in zip(self._columns,
+                                                                                               self.schema)]
+        self._writer.write_batch(self.pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self._columns = {name: [] for name, _ in COLUMNS}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_writer(path, format='json', pretty=False, compression=None, append=False):
+    if format == 'json':
+        return JsonWriter(open_text(path, append=append, compression=compression), pretty=pretty)
+    if format in ('parquet', 'arrow'):
+        if append:
+            raise ValueError('%s output can\'t be appended to' % format)
+        if format == 'arrow' and compression not in (None,) + ARROW_COMPRESSIONS:
+            raise ValueError('arrow output can only be compressed with %s' % ', '.join(ARROW_COMPRESSIONS))
+        return ArrowWriter(path, format=format, compression=compression)
+    raise ValueError('Unknown output format: %s' % format)
+
+
+class Progress(object):
+    # Rewrites a 'Downloaded N comment(s)' line at most every `interval` seconds
+
+    def __init__(self, interval=0.5, stream=None):
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self._last = 0
+
+    def update(self, count, force=False):
+        now = time.monotonic()
+        if force or now - self._last >= self.interval:
+            self._last = now
+            self.stream.write('Downloaded %d comment(s)\r' % count)
+            self.stream.flush()